@@ -0,0 +1,122 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import pydeck as pdk
+import streamlit as st
+from matplotlib.figure import Figure
+
+
+# Rendered charts kept per server process; the least recently shown ones are
+# dropped once they take more than this many bytes
+CHART_CACHE_BYTES = 256 * 2**20
+
+# Same PNG settings as st.pyplot
+PYPLOT_SAVEFIG = {'format': 'png', 'bbox_inches': 'tight', 'dpi': 200}
+
+
+# Least recently used artifacts by total size
+class ChartCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, artifact):
+        with self.lock:
+            if key in self.entries:
+                self.size -= _artifact_size(self.entries.pop(key))
+            self.entries[key] = artifact
+            self.size += _artifact_size(artifact)
+            while self.size > self.capacity and len(self.entries) > 1:
+                self.size -= _artifact_size(self.entries.popitem(last=False)[1])
+
+
+def _artifact_size(artifact):
+    return len(artifact[1])
+
+
+@st.cache_resource
+def _chart_cache():
+    return ChartCache(CHART_CACHE_BYTES)
+
+
+def _update(sha, value):
+    if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+        names = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+        sha.update(repr((type(value).__name__, list(names), list(getattr(value, 'index', value).names))).encode())
+        sha.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        sha.update(repr((value.dtype.str, value.shape)).encode())
+        sha.update(np.ascontiguousarray(value).tobytes())
+    else:
+        sha.update(repr(value).encode())
+
+
+# Content address of a chart: its name, the data it is drawn from and its
+# parameters
+def chart_key(name, *inputs, **params):
+    sha = hashlib.sha1(name.encode())
+    for value in inputs:
+        _update(sha, value)
+    _update(sha, sorted(params.items()))
+    return sha.hexdigest()
+
+
+# A deck replayed from the JSON it was rendered to
+class _RenderedDeck(pdk.Deck):
+    def __init__(self, spec, tooltip):
+        super().__init__(layers=[], tooltip=tooltip)
+        self.spec = spec
+
+    def to_json(self):
+        return self.spec
+
+
+# One chart of a page. When its artifact is cached the page skips building
+# the chart and show() replays it; otherwise the page builds it and save()
+# renders it (PNG for matplotlib, figure JSON for plotly, deck JSON for
+# pydeck) into the cache.
+class ChartArtifact:
+    def __init__(self, name, *inputs, **params):
+        self.key = chart_key(name, *inputs, **params)
+        self.artifact = _chart_cache().get(self.key)
+
+    @property
+    def missing(self):
+        return self.artifact is None
+
+    def save(self, chart):
+        if chart is plt or isinstance(chart, Figure):
+            figure = plt.gcf() if chart is plt else chart
+            image = io.BytesIO()
+            figure.savefig(image, **PYPLOT_SAVEFIG)
+            plt.close(figure)
+            self.artifact = ('pyplot', image.getvalue())
+        elif isinstance(chart, pdk.Deck):
+            self.artifact = ('pydeck', chart.to_json(), chart._tooltip)
+        else:
+            self.artifact = ('plotly', chart.to_json())
+        _chart_cache().put(self.key, self.artifact)
+
+    def show(self):
+        kind, payload = self.artifact[:2]
+        if kind == 'pyplot':
+            st.image(payload, width='stretch')
+        elif kind == 'pydeck':
+            st.pydeck_chart(_RenderedDeck(payload, self.artifact[2]))
+        else:
+            st.plotly_chart(pio.from_json(payload))
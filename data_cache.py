@@ -0,0 +1,39 @@
+import hashlib
+import os
+import pickle
+
+
+CACHE_DIR = '.cache'
+
+# Nanoseconds in a day, the unit of datetime64[ns] values
+DAY_NS = 86_400 * 10**9
+
+
+# Identify a source file by its path, size and modification time, so every cache
+# derived from it is rebuilt as soon as the file is replaced
+def file_fingerprint(path):
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def cache_path(path, fingerprint, suffix):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}-{fingerprint}{suffix}")
+
+
+# Write through a temporary file so that concurrent processes never read a
+# partially written cache
+def write_atomic(frame, target):
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    temporary = f"{target}.{os.getpid()}.tmp"
+    frame.to_parquet(temporary, index=False)
+    os.replace(temporary, target)
+
+
+def pickle_atomic(obj, target):
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    temporary = f"{target}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as handle:
+        pickle.dump(obj, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, target)
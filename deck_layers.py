@@ -0,0 +1,68 @@
+import json
+import re
+import weakref
+
+import numpy as np
+import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
+
+
+# Decimal places kept for floats sent to the browser; five decimals of a
+# degree is about 1 m, well below what a city map can show
+LAYER_DECIMALS = 5
+
+# Columns shipped by each layer built with map_layer, in row order
+_LAYER_COLUMNS = weakref.WeakKeyDictionary()
+
+
+def _references(expression, column):
+    return re.search(rf'(?<![\w.]){re.escape(column)}(?!\w)', expression) is not None
+
+
+def _to_positions(expression, columns):
+    for position, column in enumerate(columns):
+        expression = re.sub(rf'(?<![\w.]){re.escape(column)}(?!\w)', f'this[{position}]', expression)
+    return expression
+
+
+# A pydeck layer whose data travels as one compact array per row, holding
+# only the columns its accessors use, instead of one dictionary per row with
+# every column. Accessors keep naming columns and are rewritten to positions.
+def map_layer(type, frame, **props):
+    accessors = {name: value for name, value in props.items()
+                 if name.startswith('get_') and isinstance(value, str)}
+    columns = [column for column in frame.columns
+               if any(_references(value, column) for value in accessors.values())]
+    values = []
+    for column in columns:
+        array = np.asarray(frame[column])
+        if array.dtype.kind == 'f':
+            array = array.astype('float64').round(LAYER_DECIMALS)
+        values.append(array.tolist())
+    for name, value in accessors.items():
+        props[name] = _to_positions(value, columns)
+    layer = pdk.Layer(type, data=[list(row) for row in zip(*values)], **props)
+    _LAYER_COLUMNS[layer] = columns
+    return layer
+
+
+def _tooltip_field(match, layers):
+    for layer in layers:
+        columns = _LAYER_COLUMNS.get(layer, [])
+        if match.group(1) in columns:
+            return '{%d}' % columns.index(match.group(1))
+    return match.group(0)
+
+
+# A Deck written as compact JSON, which the C encoder produces several times
+# faster than pydeck's indented output. Tooltip fields naming columns of
+# map_layer data are pointed at their positions.
+class CompactDeck(pdk.Deck):
+    def __init__(self, layers=None, tooltip=True, **kwargs):
+        if isinstance(tooltip, dict):
+            tooltip = {key: re.sub(r'\{(\w+)\}', lambda match: _tooltip_field(match, layers or []), text)
+                       if isinstance(text, str) else text for key, text in tooltip.items()}
+        super().__init__(layers=layers, tooltip=tooltip, **kwargs)
+
+    def to_json(self):
+        return json.dumps(self, sort_keys=True, default=default_serialize, separators=(',', ':'))
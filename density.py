@@ -0,0 +1,38 @@
+import numpy as np
+
+
+# Grid points of binned kernel density estimates
+KDE_GRID_POINTS = 512
+
+
+# Gaussian kernel density of a sample given as counts on an even grid. The
+# kernel is convolved with the counts through the FFT, so the cost depends on
+# the grid size and not on the sample size.
+def binned_kde(counts, step, bandwidth):
+    points = len(counts)
+    offsets = np.arange(-(points - 1), points) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = 1 << int(np.ceil(np.log2(points + len(kernel) - 1)))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+    return smoothed[points - 1:2 * points - 1] / max(counts.sum(), 1)
+
+
+# Density curve of a sample with Scott's bandwidth, as scipy and seaborn
+# estimate it, on a grid reaching cut bandwidths past the data. The sample is
+# linearly binned onto the grid first. An empty sample has an empty curve.
+def kde_curve(values, points=KDE_GRID_POINTS, cut=3):
+    values = np.asarray(values, dtype='float64')
+    if not len(values):
+        return np.empty(0), np.empty(0)
+    bandwidth = values.std(ddof=1) * len(values) ** (-1 / 5) if len(values) > 1 else 0.0
+    if not bandwidth > 0:
+        bandwidth = 1.0
+    low = values.min() - cut * bandwidth
+    grid = np.linspace(low, values.max() + cut * bandwidth, points)
+    step = grid[1] - grid[0]
+    position = (values - low) / step
+    left = np.floor(position).astype('int64')
+    share = position - left
+    counts = (np.bincount(left, 1 - share, minlength=points + 1)
+              + np.bincount(left + 1, share, minlength=points + 1))[:points]
+    return grid, binned_kde(counts, step, bandwidth)
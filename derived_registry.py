@@ -0,0 +1,42 @@
+import threading
+
+import numpy as np
+import streamlit as st
+
+
+# Values derived from a cached dataset, by registry then name. Each entry is
+# computed on first use from the dataset version and other entries, then kept
+# read-only next to the cached dataset and shared by every tab and session.
+REGISTRIES = {}
+
+
+# Decorator registering a function of the dataset version as an entry of the
+# named registry
+def registry(registry_name):
+    computes = REGISTRIES.setdefault(registry_name, {})
+
+    def derived(name):
+        def register(compute):
+            computes[name] = compute
+            return compute
+        return register
+    return derived
+
+
+def freeze(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    return value
+
+
+@st.cache_resource(max_entries=12)
+def _entries(registry_name, version):
+    return {'lock': threading.RLock(), 'values': {}}
+
+
+def derived_value(registry_name, version, name):
+    entries = _entries(registry_name, version)
+    with entries['lock']:
+        if name not in entries['values']:
+            entries['values'][name] = freeze(REGISTRIES[registry_name][name](version))
+        return entries['values'][name]
@@ -13,10 +13,19 @@ from scipy.cluster.hierarchy import dendrogram, linkage
 import statsmodels.api as sm
 from wordcloud import WordCloud
 import pycountry
+from chart_cache import ChartArtifact
+from rga_derived import (DATE_POINT_LIMIT, WORD_CLOUD_FILTERS, WORD_CLOUD_SIZE, caliber_length_stats, date_bounds,
+                         date_points, date_raster, date_window, length_calibers, model_word_frequencies)
+from rga_store import RGA_CATEGORY_COLUMNS, guns_version, load_guns_counts, load_guns_data, rga_count, rga_crosstab, rga_pair_count
 
 
 
-df = pd.read_csv('guns.csv', sep=',', encoding='ISO-8859-1')
+# Load the data (typed, date-parsed and shared across sessions, so work on a shallow copy)
+df = load_guns_data().copy(deep=False)
+dataset = guns_version()
+
+# Counts behind every categorical chart, computed in one pass when the data loads and kept up to date incrementally
+counts = load_guns_counts()
 
 
 
@@ -101,20 +110,24 @@ with tabs[1]:
     By visualizing the frequency of each family, we can identify which types of firearms are more common.
     """)
 
-    # Plotting the histogram
-    plt.figure(figsize=(10, 6))
-    ax = sns.countplot(y="famille", data=df, palette="viridis", order=df["famille"].value_counts().index)
-    
-    # Adding counts to the bars
-    for p in ax.patches:
-        count = int(p.get_width())  # Get the count
-        ax.annotate(f'{count}', (p.get_width() + 100, p.get_y() + p.get_height() / 2), 
-                    va='center')  # Annotate the count at the end of each bar
-
-    plt.title('Distribution of Firearm Families')
-    plt.xlabel('Count')
-    plt.ylabel('Firearm Family')
-    st.pyplot(plt)
+    # Plotting the histogram from the precomputed counts, rendered once per version of the data
+    famille_counts = rga_count(counts, 'famille')
+    chart = ChartArtifact('famille', famille_counts)
+    if chart.missing:
+        plt.figure(figsize=(10, 6))
+        ax = sns.barplot(x=famille_counts.values, y=famille_counts.index, palette="viridis", order=famille_counts.index)
+
+        # Adding counts to the bars
+        for p in ax.patches:
+            count = int(p.get_width())  # Get the count
+            ax.annotate(f'{count}', (p.get_width() + 100, p.get_y() + p.get_height() / 2),
+                        va='center')  # Annotate the count at the end of each bar
+
+        plt.title('Distribution of Firearm Families')
+        plt.xlabel('Count')
+        plt.ylabel('Firearm Family')
+        chart.save(plt)
+    chart.show()
 
 #VISU 2
  
@@ -126,47 +139,54 @@ with tabs[1]:
     and this allows us to see how types are distributed across families.
     """)
 
-    # Enlarging the figure
-    plt.figure(figsize=(16, 10))  # Increased figure size for clarity
+    type_counts = rga_pair_count(counts, 'typeArme', 'famille').reset_index()
+    chart = ChartArtifact('typeArme_famille', type_counts)
+    if chart.missing:
+        # Enlarging the figure
+        plt.figure(figsize=(16, 10))  # Increased figure size for clarity
 
-    # Plotting the bar plot with increased font sizes
-    ax = sns.countplot(y="typeArme", data=df, hue="famille", palette="viridis",
-                       order=df["typeArme"].value_counts().index)
+        # Plotting the bar plot with increased font sizes
+        ax = sns.barplot(data=type_counts, x="count", y="typeArme", hue="famille", palette="viridis",
+                         order=rga_count(counts, "typeArme").index, hue_order=sorted(type_counts['famille'].unique()))
 
-    # Adding counts to the bars with increased font size
-    for p in ax.patches:
-        count = int(p.get_width())  # Get the count
-        ax.annotate(f'{count}', (p.get_width() + 50, p.get_y() + p.get_height() / 2),
-                    va='center', fontsize=12)  # Increased font size for annotations
+        # Adding counts to the bars with increased font size
+        for p in ax.patches:
+            count = int(p.get_width())  # Get the count
+            ax.annotate(f'{count}', (p.get_width() + 50, p.get_y() + p.get_height() / 2),
+                        va='center', fontsize=12)  # Increased font size for annotations
 
-    # Move the legend to the bottom right with increased font size
-    ax.legend(title="Firearm Family", loc='lower right', bbox_to_anchor=(1, 0), fontsize=12, title_fontsize=14)
+        # Move the legend to the bottom right with increased font size
+        ax.legend(title="Firearm Family", loc='lower right', bbox_to_anchor=(1, 0), fontsize=12, title_fontsize=14)
 
-    # Adjusting the font sizes for the title, labels, and ticks
-    plt.title('Distribution of Firearm Types by Family', fontsize=18)
-    plt.xlabel('Count', fontsize=14)
-    plt.ylabel('Firearm Type', fontsize=14)
+        # Adjusting the font sizes for the title, labels, and ticks
+        plt.title('Distribution of Firearm Types by Family', fontsize=18)
+        plt.xlabel('Count', fontsize=14)
+        plt.ylabel('Firearm Type', fontsize=14)
 
-    # Increase tick label font size for better readability
-    ax.tick_params(axis='x', labelsize=12)
-    ax.tick_params(axis='y', labelsize=12)
+        # Increase tick label font size for better readability
+        ax.tick_params(axis='x', labelsize=12)
+        ax.tick_params(axis='y', labelsize=12)
+        chart.save(plt)
 
     # Displaying the plot
-    st.pyplot(plt)
+    chart.show()
 
-    top_families = df['typeArme'].value_counts().nlargest(5)
+    top_families = rga_count(counts, 'typeArme').nlargest(5)
 
     # Pie chart
-    plt.figure(figsize=(8, 8))  # Increase the figure size for clarity
+    chart = ChartArtifact('top_families', top_families)
+    if chart.missing:
+        plt.figure(figsize=(8, 8))  # Increase the figure size for clarity
 
-    # Create the pie chart
-    plt.pie(top_families, labels=top_families.index, autopct='%1.1f%%', startangle=90, colors=sns.color_palette('viridis', 5))
+        # Create the pie chart
+        plt.pie(top_families, labels=top_families.index, autopct='%1.1f%%', startangle=90, colors=sns.color_palette('viridis', 5))
 
-    # Add a title
-    plt.title("Top 5 Firearm Families by Occurrence", fontsize=16)
+        # Add a title
+        plt.title("Top 5 Firearm Families by Occurrence", fontsize=16)
+        chart.save(plt)
 
-    # Display the pie 
-    st.pyplot(plt)
+    # Display the pie
+    chart.show()
 
 
 #VISU 3
@@ -179,24 +199,27 @@ with tabs[1]:
     """)
 
     # Group by brand and get their occurrences
-    brand_counts = df['marque'].value_counts()
+    brand_counts = rga_count(counts, 'marque')
 
     # Create a horizontal bar chart
-    plt.figure(figsize=(12, 8))  # Set the figure size
-    bars = plt.barh(brand_counts.index[:10], brand_counts.values[:10], color='skyblue')  # Show top 10 brands
-
-    # Add a title and labels
-    plt.title("Distribution of Firearms by Brand (Top 10)", fontsize=16)
-    plt.xlabel("Number of Firearms", fontsize=14)
-    plt.ylabel("Brand", fontsize=14)
-
-    # Add counts to the right of the bars
-    for bar in bars:
-        plt.text(bar.get_width(), bar.get_y() + bar.get_height()/2, 
-                 int(bar.get_width()), va='center', fontsize=12)
+    chart = ChartArtifact('brands', brand_counts.head(10))
+    if chart.missing:
+        plt.figure(figsize=(12, 8))  # Set the figure size
+        bars = plt.barh(brand_counts.index[:10], brand_counts.values[:10], color='skyblue')  # Show top 10 brands
+
+        # Add a title and labels
+        plt.title("Distribution of Firearms by Brand (Top 10)", fontsize=16)
+        plt.xlabel("Number of Firearms", fontsize=14)
+        plt.ylabel("Brand", fontsize=14)
+
+        # Add counts to the right of the bars
+        for bar in bars:
+            plt.text(bar.get_width(), bar.get_y() + bar.get_height()/2,
+                     int(bar.get_width()), va='center', fontsize=12)
+        chart.save(plt)
 
     # Display the bar chart
-    st.pyplot(plt)
+    chart.show()
 
 #VISU 4
     st.subheader("Distribution of Firearms by Manufacturer")
@@ -208,20 +231,23 @@ with tabs[1]:
     """)
 
     # Group by manufacturer and get their occurrences
-    manufacturer_counts = df['fabricant'].value_counts()
+    manufacturer_counts = rga_count(counts, 'fabricant')
 
     # Select the top 5 manufacturers
     top_manufacturers = manufacturer_counts.head(5)
 
     # Create a pie chart
-    plt.figure(figsize=(10, 8))  # Set the figure size
-    plt.pie(top_manufacturers, labels=top_manufacturers.index, autopct='%1.1f%%', startangle=140, colors=plt.cm.tab10.colors)
-    
-    # Add a title
-    plt.title("Distribution of Firearms by Manufacturer", fontsize=16)
+    chart = ChartArtifact('top_manufacturers', top_manufacturers)
+    if chart.missing:
+        plt.figure(figsize=(10, 8))  # Set the figure size
+        plt.pie(top_manufacturers, labels=top_manufacturers.index, autopct='%1.1f%%', startangle=140, colors=plt.cm.tab10.colors)
+
+        # Add a title
+        plt.title("Distribution of Firearms by Manufacturer", fontsize=16)
+        chart.save(plt)
 
     # Display the pie chart
-    st.pyplot(plt)
+    chart.show()
 
 
 #VISU 5
@@ -234,26 +260,29 @@ with tabs[1]:
     """)
 
     # Group by country and count the number of firearms produced
-    country_counts = df['paysFabricant'].value_counts().reset_index()
+    country_counts = rga_count(counts, 'paysFabricant').reset_index()
     country_counts.columns = ['Country', 'Number of Firearms']
 
     # Create a world map with markers
-    fig = px.choropleth(country_counts, 
-                        locations='Country',
-                        locationmode='country names',
-                        color='Number of Firearms',
-                        hover_name='Country',
-                        color_continuous_scale=px.colors.sequential.Plasma,
-                        title='Number of Firearms Produced by Country',
-                        labels={'Number of Firearms': 'Number of Firearms'},
-                        projection='natural earth')
-
-    # Update layout for better appearance
-    fig.update_layout(title_font_size=20,
-                      geo=dict(showland=True, landcolor='lightgray'))
+    chart = ChartArtifact('country_map', country_counts)
+    if chart.missing:
+        fig = px.choropleth(country_counts,
+                            locations='Country',
+                            locationmode='country names',
+                            color='Number of Firearms',
+                            hover_name='Country',
+                            color_continuous_scale=px.colors.sequential.Plasma,
+                            title='Number of Firearms Produced by Country',
+                            labels={'Number of Firearms': 'Number of Firearms'},
+                            projection='natural earth')
+
+        # Update layout for better appearance
+        fig.update_layout(title_font_size=20,
+                          geo=dict(showland=True, landcolor='lightgray'))
+        chart.save(fig)
 
     # Display the map
-    st.plotly_chart(fig)
+    chart.show()
 
 
 
@@ -270,31 +299,30 @@ with tabs[2]:
     illustrating the number of firearms created each year.
     """)
 
-    # Convert 'dateCreaRGA' to datetime and extract the year
-    df['dateCreaRGA'] = pd.to_datetime(df['dateCreaRGA'], errors='coerce')
-    df['Year'] = df['dateCreaRGA'].dt.year
-
     # Count the number of firearms created per year
-    yearly_counts = df['Year'].value_counts().reset_index()
+    yearly_counts = rga_count(counts, 'yearCreated').reset_index()
     yearly_counts.columns = ['Year', 'Number of Firearms']
     yearly_counts = yearly_counts.sort_values('Year')
 
     # Create a line plot
-    fig = px.line(yearly_counts, 
-                  x='Year', 
-                  y='Number of Firearms', 
-                  title='Number of Firearms Created Over Time',
-                  labels={'Number of Firearms': 'Number of Firearms'},
-                  markers=True)
-
-    # Update layout for better appearance
-    fig.update_layout(title_font_size=20,
-                      xaxis_title='Year',
-                      yaxis_title='Number of Firearms',
-                      xaxis=dict(tickmode='linear'))
+    chart = ChartArtifact('yearly_creations', yearly_counts)
+    if chart.missing:
+        fig = px.line(yearly_counts,
+                      x='Year',
+                      y='Number of Firearms',
+                      title='Number of Firearms Created Over Time',
+                      labels={'Number of Firearms': 'Number of Firearms'},
+                      markers=True)
+
+        # Update layout for better appearance
+        fig.update_layout(title_font_size=20,
+                          xaxis_title='Year',
+                          yaxis_title='Number of Firearms',
+                          xaxis=dict(tickmode='linear'))
+        chart.save(fig)
 
     # Display the line plot
-    st.plotly_chart(fig)
+    chart.show()
 
 
 #VISU 7
@@ -307,29 +335,51 @@ with tabs[2]:
     the last updated date on the y-axis.
     """)
 
-    # Convert 'dateCreaRGA' and 'dateMajRGA' to datetime
-    df['dateCreaRGA'] = pd.to_datetime(df['dateCreaRGA'], errors='coerce')
-    df['dateMajRGA'] = pd.to_datetime(df['dateMajRGA'], errors='coerce')
-
-    # Drop rows with missing values in creation or update dates
-    scatter_df = df.dropna(subset=['dateCreaRGA', 'dateMajRGA'])
-
-    # Create a scatter plot
-    fig = px.scatter(scatter_df,
-                     x='dateCreaRGA', 
-                     y='dateMajRGA',
-                     title='Comparison of Creation and Update Dates',
-                     labels={'dateCreaRGA': 'Creation Date', 'dateMajRGA': 'Update Date'},
-                     hover_data=['referenceRGA'])  # Add reference number to hover information
-
-    # Update layout for better appearance
-    fig.update_traces(marker=dict(size=5, opacity=0.7))
-    fig.update_layout(title_font_size=20,
-                      xaxis_title='Creation Date',
-                      yaxis_title='Update Date')
+    # Dates shown. Windows holding more than DATE_POINT_LIMIT firearms are drawn
+    # as a density image binned on the server, whose size does not depend on the
+    # number of rows; narrower windows are drawn as individual WebGL points.
+    created_first, created_last, updated_first, updated_last = date_bounds(dataset)
+    col1, col2 = st.columns(2)
+    created_range = col1.slider("Creation dates:", created_first, created_last, (created_first, created_last))
+    updated_range = col2.slider("Update dates:", updated_first, updated_last, (updated_first, updated_last))
+    date_range = created_range + updated_range
+    picks = date_window(dataset, date_range)
+
+    chart = ChartArtifact('creation_update_dates', dataset, window=date_range)
+    if chart.missing:
+        if len(picks) <= DATE_POINT_LIMIT:
+            scatter_df = date_points(dataset, picks)
+
+            # Create a scatter plot
+            fig = px.scatter(scatter_df,
+                             x='dateCreaRGA',
+                             y='dateMajRGA',
+                             title='Comparison of Creation and Update Dates',
+                             labels={'dateCreaRGA': 'Creation Date', 'dateMajRGA': 'Update Date'},
+                             hover_data=['referenceRGA'],  # Add reference number to hover information
+                             render_mode='webgl')
+            fig.update_traces(marker=dict(size=5, opacity=0.7))
+        else:
+            # Density image of the window, empty cells left transparent
+            raster = date_raster(dataset, date_range)
+            fig = go.Figure(go.Heatmap(x=raster['created'],
+                                       y=raster['updated'],
+                                       z=np.where(raster['counts'] > 0, raster['counts'], np.nan),
+                                       colorscale='Viridis',
+                                       colorbar=dict(title='Firearms'),
+                                       hovertemplate='Creation: %{x}<br>Update: %{y}<br>Firearms: %{z}<extra></extra>'))
+            fig.update_layout(title='Comparison of Creation and Update Dates')
+
+        # Update layout for better appearance
+        fig.update_layout(title_font_size=20,
+                          xaxis_title='Creation Date',
+                          yaxis_title='Update Date')
+        chart.save(fig)
 
     # Display the scatter plot
-    st.plotly_chart(fig)
+    chart.show()
+    if len(picks) > DATE_POINT_LIMIT:
+        st.caption(f"{len(picks)} firearms shown as density. Narrow the dates to {DATE_POINT_LIMIT} firearms or fewer to see individual points.")
 
 
 #VISU 8
@@ -341,37 +391,34 @@ with tabs[2]:
     It provides insights into the frequency of updates over time.
     """)
 
-    # Convert 'dateMajRGA' to datetime
-    df['dateMajRGA'] = pd.to_datetime(df['dateMajRGA'], errors='coerce')
-
-    # Extract year from 'dateMajRGA'
-    df['year_updated'] = df['dateMajRGA'].dt.year
-
     # Count occurrences of updates for each year
-    update_counts = df['year_updated'].value_counts().sort_index()
+    update_counts = rga_count(counts, 'yearUpdated').sort_index()
 
     # Create a histogram
-    fig = go.Figure()
-
-    # Add a bar trace
-    fig.add_trace(go.Bar(
-        x=update_counts.index, 
-        y=update_counts.values,
-        marker=dict(color='royalblue'),
-        text=update_counts.values,  # Text labels for bars
-        textposition='outside'       # Positioning of text labels
-    ))
-
-    # Update layout for better appearance
-    fig.update_layout(
-        title='Number of Firearms Updated per Year',
-        xaxis_title='Year',
-        yaxis_title='Number of Updates',
-        title_font_size=20
-    )
+    chart = ChartArtifact('yearly_updates', update_counts)
+    if chart.missing:
+        fig = go.Figure()
+
+        # Add a bar trace
+        fig.add_trace(go.Bar(
+            x=update_counts.index,
+            y=update_counts.values,
+            marker=dict(color='royalblue'),
+            text=update_counts.values,  # Text labels for bars
+            textposition='outside'       # Positioning of text labels
+        ))
+
+        # Update layout for better appearance
+        fig.update_layout(
+            title='Number of Firearms Updated per Year',
+            xaxis_title='Year',
+            yaxis_title='Number of Updates',
+            title_font_size=20
+        )
+        chart.save(fig)
 
     # Display the histogram
-    st.plotly_chart(fig)
+    chart.show()
 
 
 #VISU 9 
@@ -393,26 +440,29 @@ with tabs[3]:
     This KDE plot visualizes the density distribution of firearm lengths. 
     """)
 
-    # Set up the plot
-    fig, ax = plt.subplots(figsize=(10, 6))
+    chart = ChartArtifact('length_histogram', dataset)
+    if chart.missing:
+        # Set up the plot
+        fig, ax = plt.subplots(figsize=(10, 6))
 
-    # Create histogram using Seaborn
-    sns.histplot(df['longueurArme'], 
-                 bins=50,    # Number of bins
-                 kde=False,  # Disable KDE line
-                 color="lightblue", 
-                 ax=ax)
+        # Create histogram using Seaborn
+        sns.histplot(df['longueurArme'],
+                     bins=50,    # Number of bins
+                     kde=False,  # Disable KDE line
+                     color="lightblue",
+                     ax=ax)
 
-    # Set x-axis limit to 0-2000 cm
-    ax.set_xlim(0, 2000)
+        # Set x-axis limit to 0-2000 cm
+        ax.set_xlim(0, 2000)
 
-    # Set titles and labels
-    ax.set_title('Firearm Length Distribution', fontsize=16)
-    ax.set_xlabel('Firearm Length (cm)', fontsize=12)
-    ax.set_ylabel('Number of Firearms', fontsize=12)
+        # Set titles and labels
+        ax.set_title('Firearm Length Distribution', fontsize=16)
+        ax.set_xlabel('Firearm Length (cm)', fontsize=12)
+        ax.set_ylabel('Number of Firearms', fontsize=12)
+        chart.save(fig)
 
     # Show the plot in Streamlit
-    st.pyplot(fig)
+    chart.show()
 
 
 #VISU 11
@@ -422,30 +472,32 @@ with tabs[3]:
     This Bubble Chart presents the most common calibers in the dataset. 
     """)
 
-    caliber_counts = df['calibreCanonUn'].value_counts().reset_index()
+    caliber_counts = rga_count(counts, 'calibreCanonUn').reset_index()
     caliber_counts.columns = ['calibre', 'count']
-
-    # Create a bubble chart
-    fig_caliber_bubble = px.scatter(
-        caliber_counts,
-        x='calibre',
-        y='count',
-        size='count',
-        color='calibre',
-        title='Analyse du Calibre Principal des Armes',
-        labels={'calibre': 'Calibre Principal', 'count': 'Nombre d\'Armes'},
-        hover_name='calibre',
-        size_max=30,
-        template='plotly_white'
+    chart = ChartArtifact('caliber_bubble', caliber_counts)
+    if chart.missing:
+        # Create a bubble chart
+        fig_caliber_bubble = px.scatter(
+            caliber_counts,
+            x='calibre',
+            y='count',
+            size='count',
+            color='calibre',
+            title='Analyse du Calibre Principal des Armes',
+            labels={'calibre': 'Calibre Principal', 'count': 'Nombre d\'Armes'},
+            hover_name='calibre',
+            size_max=30,
+            template='plotly_white'
+        )
+
+        fig_caliber_bubble.update_layout(
+        width=1500,
+        height=1000
     )
-    
-    fig_caliber_bubble.update_layout(
-    width=1500,  
-    height=1000   
-)
+        chart.save(fig_caliber_bubble)
 
     # Display the bubble chart in Streamlit
-    st.plotly_chart(fig_caliber_bubble)
+    chart.show()
     
 
 #VISU 12
@@ -455,22 +507,24 @@ with tabs[3]:
     """)
 
 
-    bar_data = df.groupby(['typeCanonUn', 'modePercussionCanonUn']).size().reset_index(name='count')
-
-    # Create the grouped bar chart
-    fig_cannon_percussion_bar = px.bar(
-        bar_data,
-        x='typeCanonUn',
-        y='count',
-        color='modePercussionCanonUn',
-        barmode='group',
-        title='Types of Cannons VS Percussion Modes',
-        labels={'x': 'Type de Canon', 'y': 'Nombre d\'Armes'},
-        template='plotly_white'
-    )
+    bar_data = rga_pair_count(counts, 'typeCanonUn', 'modePercussionCanonUn').reset_index().sort_values(['typeCanonUn', 'modePercussionCanonUn'])
+    chart = ChartArtifact('cannon_percussion', bar_data)
+    if chart.missing:
+        # Create the grouped bar chart
+        fig_cannon_percussion_bar = px.bar(
+            bar_data,
+            x='typeCanonUn',
+            y='count',
+            color='modePercussionCanonUn',
+            barmode='group',
+            title='Types of Cannons VS Percussion Modes',
+            labels={'x': 'Type de Canon', 'y': 'Nombre d\'Armes'},
+            template='plotly_white'
+        )
+        chart.save(fig_cannon_percussion_bar)
 
     # Display the bar chart in Streamlit
-    st.plotly_chart(fig_cannon_percussion_bar)
+    chart.show()
 
 
 
@@ -478,21 +532,23 @@ with tabs[3]:
 
     st.subheader("Distribution of Amlimentation Systems")
 
-    donut_data = df['systemeAlimentation'].value_counts().reset_index()
+    donut_data = rga_count(counts, 'systemeAlimentation').reset_index()
     donut_data.columns = ['Système d\'Alimentation', 'Nombre d\'Armes']
-
-    # Create the donut chart
-    fig_donut_chart = px.pie(
-        donut_data,
-        values='Nombre d\'Armes',
-        names='Système d\'Alimentation',
-        title='Répartition des Systèmes d\'Alimentation',
-        hole=0.4,  # This creates the donut effect
-        template='plotly_white'
-    )
+    chart = ChartArtifact('alimentation_donut', donut_data)
+    if chart.missing:
+        # Create the donut chart
+        fig_donut_chart = px.pie(
+            donut_data,
+            values='Nombre d\'Armes',
+            names='Système d\'Alimentation',
+            title='Répartition des Systèmes d\'Alimentation',
+            hole=0.4,  # This creates the donut effect
+            template='plotly_white'
+        )
+        chart.save(fig_donut_chart)
 
     # Display the donut chart in Streamlit
-    st.plotly_chart(fig_donut_chart)
+    chart.show()
 
 
 
@@ -508,15 +564,32 @@ with tabs[4]:
     """)
 
     # Violin Plot
-    unique_calibers = df['calibreCanonUn'].unique()
-    selected_caliber = st.selectbox("Select a Caliber:", sorted(unique_calibers))
-
-    # Filter the dataframe for the selected caliber
-    filtered_df = df[df['calibreCanonUn'] == selected_caliber]
-
-    # Violin Plot
-    fig_violin_length_caliber = px.violin(filtered_df, x='calibreCanonUn', y='longueurArme', box=True)
-    st.plotly_chart(fig_violin_length_caliber)  
+    # Violins drawn from the caliber index: each caliber's lengths are a presorted
+    # slice, and its density and quartiles are computed once and cached
+    calibers = length_calibers(dataset)
+    selected_calibers = st.multiselect("Select calibers:", calibers, default=calibers[:1])
+
+    chart = ChartArtifact('caliber_violins', dataset, calibers=selected_calibers)
+    if chart.missing:
+        fig_violin_length_caliber = go.Figure()
+        for position, caliber in enumerate(selected_calibers):
+            stats = caliber_length_stats(dataset, caliber)
+            color = px.colors.qualitative.Plotly[position % len(px.colors.qualitative.Plotly)]
+            half_width = 0.4 * stats['density'] / stats['density'].max()
+            fig_violin_length_caliber.add_trace(go.Scatter(
+                x=np.concatenate([position - half_width, position + half_width[::-1]]),
+                y=np.concatenate([stats['grid'], stats['grid'][::-1]]),
+                fill='toself', mode='lines', line=dict(color=color), name=caliber,
+                hovertemplate=f"{caliber}<br>{stats['count']} firearms<extra></extra>"))
+            fig_violin_length_caliber.add_trace(go.Box(
+                x=[position], q1=[stats['q1']], median=[stats['median']], q3=[stats['q3']],
+                lowerfence=[stats['lowerfence']], upperfence=[stats['upperfence']],
+                width=0.1, marker_color=color, name=caliber, showlegend=False))
+        fig_violin_length_caliber.update_layout(
+            xaxis=dict(tickvals=list(range(len(selected_calibers))), ticktext=selected_calibers),
+            xaxis_title='calibreCanonUn', yaxis_title='longueurArme')
+        chart.save(fig_violin_length_caliber)
+    chart.show()
 
 
 
@@ -528,22 +601,23 @@ with tabs[4]:
     providing insights into how these characteristics interact with one another.
     """)
 
-    numeric_df = df.select_dtypes(include=[np.number])
+    chart = ChartArtifact('correlation', dataset)
+    if chart.missing:
+        # Numeric columns, with the years of creation and update
+        numeric_df = df.select_dtypes(include=[np.number]).assign(Year=df['dateCreaRGA'].dt.year,
+                                                                  year_updated=df['dateMajRGA'].dt.year)
 
-    # Check if there are any numeric columns
-    if numeric_df.empty:
-        st.write("No numeric columns available for correlation.")
-    else:
         # Correlation Matrix
         corr = numeric_df.corr()
 
         # Heatmap
-        fig_corr = px.imshow(corr, title='Heatmap of Correlation', 
+        fig_corr = px.imshow(corr, title='Heatmap of Correlation',
                               labels=dict(x='Variables', y='Variables', color='Correlation'),
                               color_continuous_scale='RdBu', zmin=-1, zmax=1)
-        st.plotly_chart(fig_corr)
+        chart.save(fig_corr)
+    chart.show()
 
-        st.write("The heatmap reveals the correlations between various weapon characteristics, highlighting potential relationships such as a strong positive correlation between `capaciteHorsChambre` and `capaciteChambre`. Variables like `longueurArme` and `Year` exhibit little to no correlation, indicating that the length of weapons is largely independent of the year of manufacture.")
+    st.write("The heatmap reveals the correlations between various weapon characteristics, highlighting potential relationships such as a strong positive correlation between `capaciteHorsChambre` and `capaciteChambre`. Variables like `longueurArme` and `Year` exhibit little to no correlation, indicating that the length of weapons is largely independent of the year of manufacture.")
 
 
 
@@ -551,13 +625,15 @@ with tabs[4]:
     st.subheader("Repartition of Semi Auto Weapons")
     
 
-    semi_auto_counts = df['armeSemiAutoApparenceArmeAuto'].value_counts().reset_index()
-    semi_auto_counts.columns = ['Appearance', 'Count'] 
-
-    fig_semi_auto = px.bar(semi_auto_counts, 
-                            x='Count', y='Appearance', orientation='h',
-                            title='Nombre d\'armes semi-auto')
-    st.plotly_chart(fig_semi_auto)
+    semi_auto_counts = rga_count(counts, 'armeSemiAutoApparenceArmeAuto').reset_index()
+    semi_auto_counts.columns = ['Appearance', 'Count']
+    chart = ChartArtifact('semi_auto', semi_auto_counts)
+    if chart.missing:
+        fig_semi_auto = px.bar(semi_auto_counts,
+                                x='Count', y='Appearance', orientation='h',
+                                title='Nombre d\'armes semi-auto')
+        chart.save(fig_semi_auto)
+    chart.show()
 
     
 with tabs[5]:
@@ -567,82 +643,93 @@ with tabs[5]:
     st.subheader("Classement Français vs Européen")
     st.write("Ce graphique compare les classements français et européens des armes.")
     
-    # Create a pivot table for visualization
-    heatmap_data = df.pivot_table(index='classementFrancais', 
-                                   columns='classementEuropeen', 
-                                   aggfunc='size', fill_value=0)
+    # Contingency table read from the precomputed pairwise counts
+    heatmap_data = rga_crosstab(counts, 'classementFrancais', 'classementEuropeen')
     
     # Clustered Bar Chart
-    heatmap_data.plot(kind='bar', figsize=(12, 6), cmap='viridis', legend=True)
-    plt.title('Comparaison des Classements Français et Européens')
-    plt.xlabel('Classement Français')
-    plt.ylabel('Nombre d\'Armes')
-    st.pyplot(plt)
+    chart = ChartArtifact('classements', heatmap_data)
+    if chart.missing:
+        heatmap_data.plot(kind='bar', figsize=(12, 6), cmap='viridis', legend=True)
+        plt.title('Comparaison des Classements Français et Européens')
+        plt.xlabel('Classement Français')
+        plt.ylabel('Nombre d\'Armes')
+        chart.save(plt)
+    chart.show()
 
 
 #VISU 17
     st.subheader("Répartition des Armes par Classement")
     st.write("Ce diagramme en secteurs montre la répartition des armes par classement français.")
-    fig_class_rank = px.pie(df, names='classementFrancais', 
-                             title='Répartition des armes par classement', 
-                             hole=0.3)
-    st.plotly_chart(fig_class_rank)
+    class_counts = rga_count(counts, 'classementFrancais').reset_index()
+    chart = ChartArtifact('classement_pie', class_counts)
+    if chart.missing:
+        fig_class_rank = px.pie(class_counts, names='classementFrancais', values='count',
+                                 title='Répartition des armes par classement',
+                                 hole=0.3)
+        chart.save(fig_class_rank)
+    chart.show()
 
 
 
 #VISU 18
-    country_counts = df['paysFabricant'].value_counts().head(20).reset_index()
+    country_counts = rga_count(counts, 'paysFabricant').head(20).reset_index()
     country_counts.columns = ['paysFabricant', 'Nombre d\'armes']
 
     # Création du graphique à barres
-    fig_country_rank = px.bar(
-        country_counts,
-        x='paysFabricant',
-        y='Nombre d\'armes',
-        title='Classement des 20 premiers pays fabricants d\'armes',
-        labels={'paysFabricant': 'Pays', 'Nombre d\'armes': 'Nombre d\'armes'},
-        color='Nombre d\'armes',
-        color_continuous_scale='Blues',  # Palette de couleurs
-    )
-
-    # Configuration de l'axe y en échelle logarithmique
-    fig_country_rank.update_yaxes(type="log")
-
-    # Ajustement de la taille du graphique
-    fig_country_rank.update_layout(
-        height=600,  # Hauteur
-        width=1000,  # Largeur
-        xaxis_tickangle=-45  # Inclinaison des légendes pour éviter la superposition
-    )
+    chart = ChartArtifact('country_rank', country_counts)
+    if chart.missing:
+        fig_country_rank = px.bar(
+            country_counts,
+            x='paysFabricant',
+            y='Nombre d\'armes',
+            title='Classement des 20 premiers pays fabricants d\'armes',
+            labels={'paysFabricant': 'Pays', 'Nombre d\'armes': 'Nombre d\'armes'},
+            color='Nombre d\'armes',
+            color_continuous_scale='Blues',  # Palette de couleurs
+        )
+
+        # Configuration de l'axe y en échelle logarithmique
+        fig_country_rank.update_yaxes(type="log")
+
+        # Ajustement de la taille du graphique
+        fig_country_rank.update_layout(
+            height=600,  # Hauteur
+            width=1000,  # Largeur
+            xaxis_tickangle=-45  # Inclinaison des légendes pour éviter la superposition
+        )
+        chart.save(fig_country_rank)
 
     # Affichage du graphique
-    st.plotly_chart(fig_country_rank)
+    chart.show()
 
 #VISU 19
-    manufacturer_counts = df['fabricant'].value_counts().reset_index()
+    manufacturer_counts = rga_count(counts, 'fabricant').reset_index()
     manufacturer_counts.columns = ['fabricant', 'Nombre d\'armes']
 
     # Création du graphique à barres
-    fig_manufacturer_rank = px.bar(
-        manufacturer_counts,
-        x='fabricant',
-        y='Nombre d\'armes',
-        title='Classement des fabricants d\'armes',
-        labels={'fabricant': 'Fabricant', 'Nombre d\'armes': 'Nombre d\'armes'},
-        color='Nombre d\'armes',
-        color_continuous_scale='Reds',  # Palette de couleurs
+    chart = ChartArtifact('manufacturer_rank', manufacturer_counts)
+    if chart.missing:
+        fig_manufacturer_rank = px.bar(
+            manufacturer_counts,
+            x='fabricant',
+            y='Nombre d\'armes',
+            title='Classement des fabricants d\'armes',
+            labels={'fabricant': 'Fabricant', 'Nombre d\'armes': 'Nombre d\'armes'},
+            color='Nombre d\'armes',
+            color_continuous_scale='Reds',  # Palette de couleurs
+        )
+
+        # Configuration de l'axe y en échelle logarithmique
+        fig_manufacturer_rank.update_yaxes(type="log")
+
+        fig_manufacturer_rank.update_layout(
+        height=600,  # Hauteur
+        width=1000   # Largeur
     )
-
-    # Configuration de l'axe y en échelle logarithmique
-    fig_manufacturer_rank.update_yaxes(type="log")
-
-    fig_manufacturer_rank.update_layout(
-    height=600,  # Hauteur
-    width=1000   # Largeur
-)
+        chart.save(fig_manufacturer_rank)
 
     # Affichage du graphique
-    st.plotly_chart(fig_manufacturer_rank)
+    chart.show()
 
 
 with tabs[6]:
@@ -651,36 +738,85 @@ with tabs[6]:
 
 #VISU 20
     st.subheader("Word Cloud of Weapon Models")
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(' '.join(df['modele'].dropna()))
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    st.pyplot(plt)
+    # Word frequencies are precomputed per version, overall and by category, so
+    # only the cloud of a new selection is ever drawn
+    col1, col2 = st.columns(2)
+    cloud_filter = col1.selectbox("Models of:", ['All firearms'] + WORD_CLOUD_FILTERS)
+    cloud_column, cloud_value = None, None
+    if cloud_filter in WORD_CLOUD_FILTERS:
+        cloud_column = cloud_filter
+        cloud_value = col2.selectbox(f"{cloud_filter}:", list(rga_count(counts, cloud_filter).index))
+    frequencies = model_word_frequencies(dataset, cloud_column, cloud_value)
+
+    if not frequencies:
+        st.write("No model names for this selection.")
+    else:
+        chart = ChartArtifact('model_wordcloud', dataset, column=cloud_column, value=cloud_value, size=WORD_CLOUD_SIZE)
+        if chart.missing:
+            width, height = WORD_CLOUD_SIZE
+            wordcloud = WordCloud(width=width, height=height, background_color='white').generate_from_frequencies(frequencies)
+            plt.figure(figsize=(10, 5))
+            plt.imshow(wordcloud, interpolation='bilinear')
+            plt.axis('off')
+            chart.save(plt)
+        chart.show()
 
 #VISU 21
     st.subheader("Top 10 Manufacturers by Number of Weapons Produced")
-    top_manufacturers = df['fabricant'].value_counts().nlargest(10).reset_index()
+    top_manufacturers = rga_count(counts, 'fabricant').head(10).reset_index()
     top_manufacturers.columns = ['Manufacturer', 'Number of Weapons']
-
-    fig_top_manufacturers = px.bar(
-        top_manufacturers,
-        x='Manufacturer',
-        y='Number of Weapons',
-        title='Top 10 Manufacturers by Number of Weapons Produced',
-        labels={'Manufacturer': 'Manufacturer', 'Number of Weapons': 'Number of Weapons'},
-        color='Number of Weapons',
-        color_continuous_scale='Blues'
-    )
-    st.plotly_chart(fig_top_manufacturers)
+    chart = ChartArtifact('top_manufacturers_bar', top_manufacturers)
+    if chart.missing:
+        fig_top_manufacturers = px.bar(
+            top_manufacturers,
+            x='Manufacturer',
+            y='Number of Weapons',
+            title='Top 10 Manufacturers by Number of Weapons Produced',
+            labels={'Manufacturer': 'Manufacturer', 'Number of Weapons': 'Number of Weapons'},
+            color='Number of Weapons',
+            color_continuous_scale='Blues'
+        )
+        chart.save(fig_top_manufacturers)
+    chart.show()
 
 #VISU 22
 
     st.subheader("Types of Weapons and Functioning Mode Heatmap")
-    heatmap_data = pd.crosstab(df['typeArme'], df['modeFonctionnement'])
-    plt.figure(figsize=(13, 7))
-    sns.heatmap(heatmap_data, annot=True, cmap='YlGnBu', fmt='g')
-    plt.title('Heatmap of Types of Weapons and Functioning Mode')
-    st.pyplot(plt)
+    heatmap_data = rga_crosstab(counts, 'typeArme', 'modeFonctionnement')
+    chart = ChartArtifact('type_mode_heatmap', heatmap_data)
+    if chart.missing:
+        plt.figure(figsize=(13, 7))
+        sns.heatmap(heatmap_data, annot=True, cmap='YlGnBu', fmt='g')
+        plt.title('Heatmap of Types of Weapons and Functioning Mode')
+        chart.save(plt)
+    chart.show()
+
+#VISU 23
+    st.subheader("Dimension Explorer")
+    st.write("""
+    This heatmap crosses any two categorical characteristics of the dataset. 
+    The table is read from counts precomputed for every pair of columns, so changing the dimensions does not rescan the data.
+    """)
+
+    col1, col2 = st.columns(2)
+    explorer_row = col1.selectbox("Rows:", RGA_CATEGORY_COLUMNS, index=RGA_CATEGORY_COLUMNS.index('typeArme'))
+    explorer_column = col2.selectbox("Columns:", RGA_CATEGORY_COLUMNS, index=RGA_CATEGORY_COLUMNS.index('paysFabricant'))
+    explorer_size = st.slider("Categories per axis:", 5, 50, 20)
+
+    if explorer_row == explorer_column:
+        st.write("Select two different dimensions.")
+    else:
+        # Keep the most frequent categories of each dimension
+        crosstab = rga_crosstab(counts, explorer_row, explorer_column)
+        crosstab = crosstab.loc[crosstab.sum(axis=1).nlargest(explorer_size).index,
+                                crosstab.sum(axis=0).nlargest(explorer_size).index]
+        chart = ChartArtifact('dimension_explorer', crosstab)
+        if chart.missing:
+            fig_explorer = px.imshow(crosstab, text_auto=True, aspect='auto', color_continuous_scale='YlGnBu',
+                                     labels=dict(x=explorer_column, y=explorer_row, color='Nombre d\'armes'),
+                                     title=f'{explorer_row} vs {explorer_column}')
+            chart.save(fig_explorer)
+        chart.show()
 
 
 
@@ -0,0 +1,231 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from wordcloud import STOPWORDS
+
+from data_cache import DAY_NS
+from density import kde_curve
+from derived_registry import derived_value, freeze, registry
+from rga_store import code_counts, load_guns_version
+
+
+# Cells per side of the creation vs update density image. The figure only
+# carries these counts, so its size does not grow with the referential.
+DATE_RASTER_SIZE = 200
+# Most entries drawn as individual points; wider windows are drawn as density
+DATE_POINT_LIMIT = 5_000
+
+# Words of the model names, split as WordCloud splits text
+MODEL_WORD_PATTERN = r"\w[\w']*"
+# Columns the word cloud can be restricted to one category of
+WORD_CLOUD_FILTERS = ['famille', 'paysFabricant']
+# Width and height in pixels of the word cloud images
+WORD_CLOUD_SIZE = (800, 400)
+
+
+# Derived arrays of the RGA frame, by name, computed from the cached frame
+derived = registry('rga')
+
+
+def rga_derived(version, name):
+    return derived_value('rga', version, name)
+
+
+def _days(dates):
+    return np.asarray(dates, dtype='datetime64[D]').astype('int64')
+
+
+def _date(day):
+    return np.datetime64(int(day), 'D').astype(object)
+
+
+# Creation and update days (since the epoch) of every entry that has both,
+# sorted by creation day, with the row position of each entry
+@derived('date_pairs')
+def _date_pairs(version):
+    frame = load_guns_version(version)
+    positions = np.flatnonzero((frame['dateCreaRGA'].notna() & frame['dateMajRGA'].notna()).to_numpy())
+    created = _days(frame['dateCreaRGA'].to_numpy()[positions])
+    updated = _days(frame['dateMajRGA'].to_numpy()[positions])
+    order = np.argsort(created, kind='stable')
+    return {'positions': freeze(positions[order]), 'created': freeze(created[order]),
+            'updated': freeze(updated[order])}
+
+
+# First and last creation and update days of the referential
+def date_bounds(version):
+    pairs = rga_derived(version, 'date_pairs')
+    return (_date(pairs['created'][0]), _date(pairs['created'][-1]),
+            _date(pairs['updated'].min()), _date(pairs['updated'].max()))
+
+
+# Positions in date_pairs of the entries created and updated within a window
+# of dates (created_first, created_last, updated_first, updated_last), bounds
+# included. The creation range is a binary search over the sorted pairs. With
+# consistent_only, entries updated before their creation are left out.
+def date_window(version, window, consistent_only=False):
+    pairs = rga_derived(version, 'date_pairs')
+    created_first, created_last, updated_first, updated_last = _days(window)
+    first = np.searchsorted(pairs['created'], created_first, 'left')
+    last = np.searchsorted(pairs['created'], created_last, 'right')
+    updated = pairs['updated'][first:last]
+    keep = (updated >= updated_first) & (updated <= updated_last)
+    if consistent_only:
+        keep &= updated >= pairs['created'][first:last]
+    return first + np.flatnonzero(keep)
+
+
+# Entries per cell of a DATE_RASTER_SIZE square grid laid over a window, with
+# the centre date of every column (creation) and row (update)
+@st.cache_resource(max_entries=32)
+def date_raster(version, window, consistent_only=False):
+    pairs = rga_derived(version, 'date_pairs')
+    picks = date_window(version, window, consistent_only)
+    created_first, created_last, updated_first, updated_last = _days(window)
+    size = DATE_RASTER_SIZE
+    created_span, updated_span = created_last + 1 - created_first, updated_last + 1 - updated_first
+    columns = (pairs['created'][picks] - created_first) * size // created_span
+    rows = (pairs['updated'][picks] - updated_first) * size // updated_span
+    counts = np.bincount(rows * size + columns, minlength=size * size).reshape(size, size)
+    centres = (np.arange(size) + 0.5) / size * DAY_NS
+    return {'counts': freeze(counts),
+            'created': freeze((created_first * DAY_NS + centres * created_span).astype('datetime64[ns]')),
+            'updated': freeze((updated_first * DAY_NS + centres * updated_span).astype('datetime64[ns]'))}
+
+
+# Creation date, update date and reference of the entries at positions of
+# date_pairs
+def date_points(version, picks):
+    frame = load_guns_version(version)
+    positions = rga_derived(version, 'date_pairs')['positions'][picks]
+    return frame[['dateCreaRGA', 'dateMajRGA', 'referenceRGA']].iloc[positions]
+
+
+# Standard form of every word of a vocabulary, merged as WordCloud merges
+# words: plurals into their singular when both occur, then case variants into
+# the most frequent one
+def _standard_forms(forms, counts):
+    forms = pd.Series(forms, dtype=object)
+    lower = forms.str.lower()
+    plural = lower.str.endswith('s') & ~lower.str.endswith('ss') & lower.str[:-1].isin(set(lower))
+    keys = lower.where(~plural, lower.str[:-1])
+    merged = pd.DataFrame({'key': keys, 'form': forms.where(~plural, forms.str[:-1]), 'count': counts,
+                           'plural': plural})
+    # Singular forms rank before forms taken from plurals, so ties resolve
+    # the way WordCloud's do
+    merged = merged.sort_values('plural', kind='stable')
+    totals = merged.groupby(['key', 'form'], sort=False)['count'].sum().reset_index()
+    standard = totals.sort_values('count', ascending=False, kind='stable').drop_duplicates('key')
+    return keys.map(standard.set_index('key')['form']).to_numpy()
+
+
+# Every word of every model name as a categorical over the vocabulary, with
+# the row it comes from. Tokens are cleaned once per distinct token, as
+# WordCloud cleans its text: possessive 's dropped, numbers and stopwords
+# left out (code -1), plurals and case variants merged.
+@derived('model_words')
+def _model_words(version):
+    frame = load_guns_version(version)
+    tokens = frame['modele'].fillna('').str.findall(MODEL_WORD_PATTERN)
+    rows = np.repeat(np.arange(len(frame)), tokens.str.len().to_numpy())
+    codes, vocabulary = pd.factorize(np.array(list(itertools.chain.from_iterable(tokens)), dtype=object))
+    cleaned = pd.Series(vocabulary, dtype=object)
+    cleaned = cleaned.where(~cleaned.str.lower().str.endswith("'s"), cleaned.str[:-2])
+    dropped = cleaned.str.isdigit() | cleaned.str.lower().isin({word.lower() for word in STOPWORDS})
+    cleaned_codes, cleaned_vocabulary = pd.factorize(cleaned.where(~dropped))
+    words = cleaned_codes[codes]
+    counts = np.bincount(words[words >= 0], minlength=len(cleaned_vocabulary))
+    standard_codes, standard_vocabulary = pd.factorize(_standard_forms(cleaned_vocabulary, counts))
+    words = np.where(words >= 0, standard_codes[words], -1)
+    return {'rows': freeze(rows), 'words': pd.Categorical.from_codes(words, standard_vocabulary)}
+
+
+# Word frequencies of the model names, overall and by category of every
+# WORD_CLOUD_FILTERS column, split on datesConsistent like the summary counts
+@derived('model_word_counts')
+def _model_word_counts(version):
+    frame = load_guns_version(version)
+    words = rga_derived(version, 'model_words')
+    rows, vocabulary = words['rows'], words['words']
+    consistent = (frame['dateMajRGA'] >= frame['dateCreaRGA']).to_numpy()[rows]
+    tables = {None: code_counts(consistent, [vocabulary], ['word'])}
+    for column in WORD_CLOUD_FILTERS:
+        categories = pd.Categorical(frame[column])
+        values = pd.Categorical.from_codes(categories.codes[rows], categories.categories)
+        tables[column] = code_counts(consistent, [values, vocabulary], [column, 'word'])
+    return tables
+
+
+# Frequencies of the model words as a dict for WordCloud, for every entry or
+# only those whose column equals value. Read from the precomputed tables.
+@st.cache_resource(max_entries=64)
+def model_word_frequencies(version, column=None, value=None, consistent_only=False):
+    table = rga_derived(version, 'model_word_counts')[column]
+    if consistent_only:
+        table = table.xs(True, level='datesConsistent')
+    else:
+        table = table.groupby(level=list(range(1, table.index.nlevels))).sum()
+    if column is not None:
+        table = table.xs(value, level=column) if value in table.index.get_level_values(column) else table.iloc[:0]
+    return {str(word): int(count) for word, count in table.items()}
+
+
+# Row positions of every caliber with the lengths of its firearms, sorted by
+# caliber then length, so that the lengths of one caliber are one slice that
+# is already sorted. Rows without a caliber or a length are left out.
+def _caliber_index(version, consistent_only):
+    frame = load_guns_version(version)
+    calibers = pd.Categorical(frame['calibreCanonUn'])
+    lengths = frame['longueurArme'].to_numpy(dtype='float64')
+    keep = (calibers.codes >= 0) & ~np.isnan(lengths)
+    if consistent_only:
+        keep &= (frame['dateMajRGA'] >= frame['dateCreaRGA']).to_numpy()
+    positions = np.flatnonzero(keep)
+    positions = positions[np.lexsort((lengths[positions], calibers.codes[positions]))]
+    codes = calibers.codes[positions]
+    present, starts = np.unique(codes, return_index=True)
+    return {'calibers': pd.Index(calibers.categories[present]),
+            'starts': freeze(np.append(starts, len(positions))),
+            'positions': freeze(positions),
+            'lengths': freeze(lengths[positions])}
+
+
+@derived('caliber_index')
+def _caliber_index_all(version):
+    return _caliber_index(version, False)
+
+
+@derived('caliber_index_consistent')
+def _caliber_index_consistent(version):
+    return _caliber_index(version, True)
+
+
+def _caliber_entry(version, consistent_only):
+    return rga_derived(version, 'caliber_index_consistent' if consistent_only else 'caliber_index')
+
+
+# Calibers with at least one known firearm length, sorted
+def length_calibers(version, consistent_only=False):
+    return list(_caliber_entry(version, consistent_only)['calibers'])
+
+
+# Sorted firearm lengths of one caliber: a hash lookup and a slice
+def caliber_lengths(version, caliber, consistent_only=False):
+    index = _caliber_entry(version, consistent_only)
+    group = index['calibers'].get_loc(caliber)
+    return index['lengths'][index['starts'][group]:index['starts'][group + 1]]
+
+
+# Violin of one caliber: the density curve of its lengths, their quartiles and
+# the whiskers of a box plot (furthest lengths within 1.5 IQR of the box)
+@st.cache_resource(max_entries=256)
+def caliber_length_stats(version, caliber, consistent_only=False):
+    lengths = caliber_lengths(version, caliber, consistent_only)
+    grid, density = kde_curve(lengths)
+    q1, median, q3 = np.quantile(lengths, [0.25, 0.5, 0.75])
+    lower = lengths[np.searchsorted(lengths, q1 - 1.5 * (q3 - q1), 'left')]
+    upper = lengths[np.searchsorted(lengths, q3 + 1.5 * (q3 - q1), 'right') - 1]
+    return {'grid': freeze(grid), 'density': freeze(density), 'count': len(lengths),
+            'q1': q1, 'median': median, 'q3': q3, 'lowerfence': lower, 'upperfence': upper}
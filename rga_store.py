@@ -0,0 +1,308 @@
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_cache import CACHE_DIR, cache_path, file_fingerprint, pickle_atomic, write_atomic
+
+
+GUNS_CSV = 'guns.csv'
+GUNS_ENCODING = 'ISO-8859-1'
+RGA_DATE_FORMAT = '%Y-%m-%d'
+RGA_DATE_COLUMNS = ['dateCreaRGA', 'dateMajRGA']
+
+# Low-cardinality text columns, stored as categoricals
+RGA_CATEGORY_COLUMNS = [
+    'famille', 'typeArme', 'marque', 'fabricant', 'paysFabricant',
+    'modeFonctionnement', 'systemeAlimentation', 'calibreCanonUn',
+    'modePercussionCanonUn', 'typeCanonUn', 'armeSemiAutoApparenceArmeAuto',
+    'classementFrancais', 'classementEuropeen', 'prototype', 'visible',
+]
+
+
+# Parse a date column with the referential's explicit format, falling back to
+# inference only if the format does not match the file at all
+def parse_rga_dates(values):
+    dates = pd.to_datetime(values, format=RGA_DATE_FORMAT, errors='coerce')
+    if dates.isna().all() and values.notna().any():
+        dates = pd.to_datetime(values, errors='coerce')
+    return dates
+
+
+def parse_guns_csv(source):
+    dtypes = {column: 'category' for column in RGA_CATEGORY_COLUMNS}
+    dtypes.update({column: str for column in RGA_DATE_COLUMNS})
+    df = pd.read_csv(source, sep=',', encoding=GUNS_ENCODING, dtype=dtypes)
+    for column in RGA_DATE_COLUMNS:
+        df[column] = parse_rga_dates(df[column])
+    return df
+
+
+# Counts behind every categorical chart of the RGA pages, keyed by the columns
+# they group on. Every count is also split on datesConsistent (update date not
+# before creation date), the filter applied by the portfolio page before its
+# later tabs.
+RGA_COUNTS = {
+    'famille': ['famille'],
+    'typeArme': ['typeArme'],
+    'marque': ['marque'],
+    'fabricant': ['fabricant'],
+    'paysFabricant': ['paysFabricant'],
+    'yearCreated': ['yearCreated'],
+    'yearUpdated': ['yearUpdated'],
+    'classementFrancais': ['classementFrancais'],
+    'classementEuropeen': ['classementEuropeen'],
+    'calibreCanonUn': ['calibreCanonUn'],
+    'systemeAlimentation': ['systemeAlimentation'],
+    'armeSemiAutoApparenceArmeAuto': ['armeSemiAutoApparenceArmeAuto'],
+}
+# Pairwise counts of every two categorical columns, keyed 'row|column' in
+# RGA_CATEGORY_COLUMNS order. Together they form a sparse contingency cube:
+# each pair only keeps the combinations that occur.
+RGA_PAIRS = list(itertools.combinations(RGA_CATEGORY_COLUMNS, 2))
+# Bumped whenever RGA_COUNTS or RGA_PAIRS change, so that stored counts are rebuilt
+RGA_COUNTS_SUFFIX = '.summary-v2.pkl'
+
+
+# Every column the counts group on as a categorical: the text columns as
+# loaded, plus the creation and update years
+def rga_summary_columns(df):
+    columns = {column: pd.Categorical(df[column]) for column in RGA_CATEGORY_COLUMNS if column in df}
+    columns['yearCreated'] = pd.Categorical(df['dateCreaRGA'].dt.year.astype('Int64'))
+    columns['yearUpdated'] = pd.Categorical(df['dateMajRGA'].dt.year.astype('Int64'))
+    return columns
+
+
+# Rows per combination of categories, split on consistent. The integer codes of
+# the columns combine into one key per row, and only the keys that occur are
+# counted, so the cost follows the rows and not the product of the category
+# counts; rows missing any of the columns are left out, as groupby does.
+def code_counts(consistent, columns, names):
+    keys = np.asarray(consistent, dtype='int64')
+    valid = np.ones(len(keys), dtype=bool)
+    for values in columns:
+        keys = keys * len(values.categories) + values.codes
+        valid &= values.codes >= 0
+    shape = [2] + [len(values.categories) for values in columns]
+    occupied, counts = np.unique(keys[valid], return_counts=True)
+    index = pd.MultiIndex(levels=[[False, True]] + [values.categories for values in columns],
+                          codes=np.unravel_index(occupied, shape), names=['datesConsistent'] + list(names))
+    return pd.Series(counts, index=index)
+
+
+# Columns of every stored count, the single counts then the pairs
+def rga_count_groups():
+    return dict(RGA_COUNTS, **{f"{row}|{column}": [row, column] for row, column in RGA_PAIRS})
+
+
+# All the counts in one pass: each column is turned into integer codes once,
+# then every count is a count of the combined codes
+def rga_counts(df):
+    columns = rga_summary_columns(df)
+    consistent = (df['dateMajRGA'] >= df['dateCreaRGA']).to_numpy()
+    return {name: code_counts(consistent, [columns[column] for column in group], group)
+            for name, group in rga_count_groups().items()}
+
+
+# Rows of the previous version that disappeared or changed, and rows of the new
+# version that appeared or changed, matched on referenceRGA and dateMajRGA
+def diff_rga(old, new):
+    old_keys = pd.MultiIndex.from_frame(old[['referenceRGA', 'dateMajRGA']])
+    new_keys = pd.MultiIndex.from_frame(new[['referenceRGA', 'dateMajRGA']])
+    removed = old[~old_keys.isin(new_keys)]
+    added = new[~new_keys.isin(old_keys)]
+    changed = set(removed['referenceRGA']) & set(added['referenceRGA'])
+    summary = {
+        'inserted': int((~added['referenceRGA'].isin(changed)).sum()),
+        'updated': len(changed),
+        'deleted': int((~removed['referenceRGA'].isin(changed)).sum()),
+    }
+    return removed, added, summary
+
+
+# Whether levels start with the values of other, without copying either when
+# they are the same object or of the same length
+def _extends(levels, other):
+    if levels is other or len(levels) == len(other):
+        return levels is other or levels.equals(other)
+    return len(levels) > len(other) and levels[:len(other)].equals(other)
+
+
+# Keys of the rows of a frame in the level codes of a stored count. Values the
+# levels lack are appended to them; rows missing any of the columns get no
+# key. Counts sharing a column share its levels (up to the values appended
+# here), so the codes of each column are mapped once and kept in mapped.
+def _delta_keys(levels, columns, consistent, group, mapped):
+    codes = [np.asarray(consistent, dtype='int64')]
+    for level, column in enumerate(group, start=1):
+        if column not in mapped or not _extends(mapped[column][0], levels[level]):
+            values = columns[column]
+            used = values.categories[np.unique(values.codes[values.codes >= 0])]
+            missing = used[levels[level].get_indexer(used) < 0]
+            if len(missing):
+                levels[level] = levels[level].append(missing)
+            lookup = levels[level].get_indexer(values.categories)
+            mapped[column] = levels[level], np.where(values.codes >= 0, lookup[values.codes], -1)
+        levels[level] = mapped[column][0]
+        codes.append(mapped[column][1])
+    valid = np.logical_and.reduce([level_codes >= 0 for level_codes in codes])
+    return [level_codes[valid] for level_codes in codes]
+
+
+# Update every count by the rows that left and the rows that arrived, instead
+# of recounting the whole referential. The changed rows are turned into the
+# level codes of each stored count, and only the keys they hit are updated;
+# counts on which the changes cancel out are kept as they are.
+def apply_count_deltas(counts, removed, added):
+    if removed.empty and added.empty:
+        return counts
+    frames = [(rga_summary_columns(frame), (frame['dateMajRGA'] >= frame['dateCreaRGA']).to_numpy(), sign, {})
+              for frame, sign in ((removed, -1), (added, 1))]
+    groups = rga_count_groups()
+    updated = {}
+    for name, series in counts.items():
+        levels = list(series.index.levels)
+        changes = [(_delta_keys(levels, columns, consistent, groups[name], mapped), sign)
+                   for columns, consistent, sign, mapped in frames]
+        shape = [len(level) for level in levels]
+        keys = np.concatenate([np.ravel_multi_index(codes, shape) for codes, _ in changes])
+        signs = np.concatenate([np.full(len(codes[0]), sign) for codes, sign in changes])
+        keys, inverse = np.unique(keys, return_inverse=True)
+        delta = np.bincount(inverse, weights=signs, minlength=len(keys)).astype('int64')
+        keys, delta = keys[delta != 0], delta[delta != 0]
+        if not len(keys):
+            updated[name] = series
+            continue
+
+        # Counts are kept ordered by key, so the stored keys are looked up by
+        # binary search and new keys are merged in at their place
+        stored = np.ravel_multi_index(series.index.codes, shape)
+        values = series.to_numpy()
+        if len(stored) > 1 and not (stored[1:] > stored[:-1]).all():
+            order = np.argsort(stored, kind='stable')
+            stored, values = stored[order], values[order]
+        positions = np.minimum(np.searchsorted(stored, keys), max(len(stored) - 1, 0))
+        found = (stored[positions] == keys) if len(stored) else np.zeros(len(keys), dtype=bool)
+        values = values.copy()
+        values[positions[found]] += delta[found]
+        if not found.all():
+            stored = np.concatenate([stored, keys[~found]])
+            values = np.concatenate([values, delta[~found]])
+            order = np.argsort(stored, kind='stable')
+            stored, values = stored[order], values[order]
+        keep = values > 0
+        index = pd.MultiIndex(levels=levels, codes=np.unravel_index(stored[keep], shape),
+                              names=series.index.names, verify_integrity=False)
+        updated[name] = pd.Series(values[keep], index=index)
+    return updated
+
+
+def _state_path(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}-current.json")
+
+
+# Bring the cached frame and counts up to date with the file on disk. When a
+# new version of the referential replaces a cached one, only the inserted,
+# updated and deleted rows are counted.
+def refresh_rga(path, fingerprint):
+    frame_path = cache_path(path, fingerprint, '.parquet')
+    counts_path = cache_path(path, fingerprint, RGA_COUNTS_SUFFIX)
+    if os.path.exists(frame_path) and os.path.exists(counts_path):
+        return frame_path, counts_path
+
+    new = parse_guns_csv(path)
+    previous_paths = []
+    if os.path.exists(_state_path(path)):
+        with open(_state_path(path)) as handle:
+            previous = json.load(handle)['fingerprint']
+        if previous != fingerprint:
+            previous_paths = [cache_path(path, previous, suffix) for suffix in ('.parquet', RGA_COUNTS_SUFFIX)]
+
+    counts = None
+    if previous_paths and all(os.path.exists(target) for target in previous_paths):
+        # Another process refreshing to the same version may remove the
+        # previous one meanwhile; everything is counted again then
+        try:
+            removed, added, summary = diff_rga(pd.read_parquet(previous_paths[0]), new)
+            counts = apply_count_deltas(pd.read_pickle(previous_paths[1]), removed, added)
+        except FileNotFoundError:
+            counts = None
+    if counts is None:
+        counts, summary = rga_counts(new), {'inserted': len(new), 'updated': 0, 'deleted': 0}
+
+    write_atomic(new, frame_path)
+    pickle_atomic(counts, counts_path)
+    temporary = f"{_state_path(path)}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as handle:
+        json.dump(dict(summary, fingerprint=fingerprint), handle)
+    os.replace(temporary, _state_path(path))
+    # The previous version is superseded
+    for target in previous_paths:
+        try:
+            os.remove(target)
+        except FileNotFoundError:
+            pass
+    return frame_path, counts_path
+
+
+@st.cache_resource(show_spinner="Loading RGA data...", max_entries=4)
+def _load_guns_frame(path, fingerprint):
+    frame_path, _ = refresh_rga(path, fingerprint)
+    return pd.read_parquet(frame_path)
+
+
+@st.cache_resource(max_entries=4)
+def _load_guns_counts(path, fingerprint):
+    _, counts_path = refresh_rga(path, fingerprint)
+    return pd.read_pickle(counts_path)
+
+
+# Decoded, typed and date-parsed once per source version and shared by every
+# session, so scripts must take a shallow copy before adding columns to it
+def load_guns_data(path=GUNS_CSV):
+    return _load_guns_frame(path, file_fingerprint(path))
+
+
+# Identifies the loaded referential: the source file with its fingerprint.
+# Caches of anything drawn from the whole frame key on it.
+def guns_version(path=GUNS_CSV):
+    return path, file_fingerprint(path)
+
+
+# The frame of a version returned by guns_version
+def load_guns_version(version):
+    return _load_guns_frame(*version)
+
+
+def load_guns_counts(path=GUNS_CSV):
+    return _load_guns_counts(path, file_fingerprint(path))
+
+
+# One precomputed count, sorted like value_counts. With consistent_only, only
+# entries whose update date is not before their creation date are counted.
+def rga_count(counts, name, consistent_only=False):
+    series = counts[name]
+    if consistent_only:
+        series = series.xs(True, level='datesConsistent')
+    else:
+        series = series.groupby(level=list(range(1, series.index.nlevels))).sum()
+    if isinstance(series.index, pd.MultiIndex):
+        series.index = series.index.remove_unused_levels()
+    return series.rename('count').sort_values(ascending=False, kind='stable')
+
+
+# Counts of one pair of categorical columns, read from the pairwise cube with
+# row as the first level
+def rga_pair_count(counts, row, column, consistent_only=False):
+    if f"{row}|{column}" in counts:
+        return rga_count(counts, f"{row}|{column}", consistent_only)
+    return rga_count(counts, f"{column}|{row}", consistent_only).swaplevel()
+
+
+# Contingency table of two categorical columns, rows by columns
+def rga_crosstab(counts, row, column, consistent_only=False):
+    return rga_pair_count(counts, row, column, consistent_only).unstack(fill_value=0)
@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+from data_cache import DAY_NS
+from uber_geo import GRID_RESOLUTION
+from uber_store import HOUR_NS
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+# Optional DuckDB backend: the sidebar switch only appears when the package is
+# installed, and every chart falls back to pandas otherwise
+def sql_backend_toggle():
+    if duckdb is None:
+        return False
+    return st.sidebar.toggle("Run aggregations with DuckDB")
+
+
+# One in-process engine per server process, using every core
+@st.cache_resource
+def _connection():
+    connection = duckdb.connect()
+    connection.execute(f"SET threads TO {os.cpu_count() or 1}")
+    return connection
+
+
+def _query(sql, params=None):
+    # Cursors share the engine but are safe to use from concurrent sessions
+    return _connection().cursor().execute(sql, params or []).df()
+
+
+def _date_bounds(start, end):
+    return pd.Timestamp(start).value, pd.Timestamp(end).value + DAY_NS
+
+
+# Trips per hour of day over the Uber Parquet caches, restricted inside the
+# scan to the selected dates, weekdays (0 is Monday), days of the month, Bases
+# and hours of the day
+def uber_hourly_counts(files, start, end, weekdays=range(7), days=(1, 31), bases=None, hours=(0, 23)):
+    conditions = ['"Date/Time" >= ?', '"Date/Time" < ?',
+                  'list_contains(?, (("Date/Time" // ?) + 3) % 7)',
+                  'day(make_timestamp("Date/Time" // 1000)) BETWEEN ? AND ?',
+                  '("Date/Time" // ?) % 24 BETWEEN ? AND ?']
+    params = [HOUR_NS, list(files), *_date_bounds(start, end), [int(weekday) for weekday in weekdays], DAY_NS, *days,
+              HOUR_NS, *hours]
+    if bases is not None:
+        conditions.append('list_contains(?, Base)')
+        params.append(list(bases))
+    counts = _query(
+        'SELECT ("Date/Time" // ?) % 24 AS hour, count(*) AS count FROM read_parquet(?) '
+        f'WHERE {" AND ".join(conditions)} GROUP BY hour ORDER BY hour',
+        params,
+    )
+    return counts.set_index('hour')['count'].reindex(pd.RangeIndex(24, name='hour'), fill_value=0)
+
+
+# Busiest pickup and next-pickup (dropoff) grid cells, with consecutive rows of
+# the start to end range paired in time order as on the maps and coordinates
+# snapped to the centre of their cell like uber_geo.grid_keys. Only trips
+# picked up within the shown days and hours are counted.
+def uber_location_counts(files, start, end, resolution=GRID_RESOLUTION, limit=40, days=None, hours=(0, 23)):
+    order = 'ORDER BY "Date/Time", filename, file_row_number'
+    trips = (
+        'SELECT "Date/Time", CAST(Lat AS DOUBLE) AS Lat, CAST(Lon AS DOUBLE) AS Lon, '
+        f'lead(CAST(Lat AS DOUBLE)) OVER ({order}) AS next_lat, '
+        f'lead(CAST(Lon AS DOUBLE)) OVER ({order}) AS next_lon '
+        'FROM read_parquet(?, filename = true, file_row_number = true) '
+        'WHERE "Date/Time" >= ? AND "Date/Time" < ?'
+    )
+    days = (start, end) if days is None else days
+    params = [list(files), *_date_bounds(start, end), *[resolution] * 4, *_date_bounds(*days), HOUR_NS, *hours]
+    counts = []
+    for lat, lon in (('Lat', 'Lon'), ('next_lat', 'next_lon')):
+        counts.append(_query(
+            f'WITH trips AS ({trips}) SELECT '
+            f'(floor(({lat} + 90) / ?) + 0.5) * ? - 90 AS {lat}, '
+            f'(floor(({lon} + 180) / ?) + 0.5) * ? - 180 AS {lon}, '
+            f'count(*) AS Frequency FROM trips WHERE next_lat IS NOT NULL '
+            f'AND "Date/Time" >= ? AND "Date/Time" < ? AND ("Date/Time" // ?) % 24 BETWEEN ? AND ? '
+            f'GROUP BY ALL ORDER BY Frequency DESC LIMIT {int(limit)}',
+            params,
+        ))
+    return tuple(counts)
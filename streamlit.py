@@ -18,6 +18,18 @@ import pycountry
 from streamlit_option_menu import option_menu
 import smtplib
 from email.mime.text import MIMEText
+from chart_cache import ChartArtifact
+from deck_layers import CompactDeck, map_layer
+from rga_derived import (DATE_POINT_LIMIT, WORD_CLOUD_FILTERS, WORD_CLOUD_SIZE, caliber_length_stats, date_bounds,
+                         date_points, date_raster, date_window, length_calibers, model_word_frequencies)
+from rga_store import RGA_CATEGORY_COLUMNS, guns_version, load_guns_counts, load_guns_data, rga_count, rga_crosstab, rga_pair_count
+from sql_backend import sql_backend_toggle, uber_hourly_counts, uber_location_counts
+from uber_derived import (HEX_RADII, SAMPLE_SIZES, SAMPLE_STRATA, WEEKDAYS, grid_cells, hotspots, hourly_counts,
+                          pickups_in_view, pickups_within, sample_positions, time_view, top_flows, trip_extremes,
+                          uber_derived, uber_derived_in_view)
+from uber_geo import METRES_PER_DEGREE, viewport_bounds, zoom_for_radius
+from uber_store import load_uber_version, uber_date_range_input, uber_parquet_files, uber_time_filter_input, uber_version
+from uber_stream import load_uber_aggregates
 
 
 
@@ -321,9 +333,6 @@ if selected == "Portfolio":
 
 elif selected == "Uber Data":
 
-
-    data = pd.read_csv('uber-raw-data-apr14.csv', parse_dates=['Date/Time'])
-
     st.title("Uberdata Visualization")
     st.write(
         "This dashboard provides insights into Uber taxi trips in New York City, showcasing various visualizations to explore patterns in pickup and dropoff locations, trip durations, and activity trends. "
@@ -342,292 +351,515 @@ elif selected == "Uber Data":
         "Each page offers unique insights into different aspects of the data, allowing you to dive deep into the fascinating world of ride-sharing trends. "
         "Select a page from the options below to begin your exploration!"
     )
+
+    # Streaming mode: the trip files are too large for memory, so they are read in
+    # chunks once and only the aggregates behind the charts are kept
+    if st.sidebar.toggle("Streaming mode for oversized trip files"):
+        aggregates = load_uber_aggregates()
+        view_state = pdk.ViewState(
+            latitude=aggregates['lat_mean'],
+            longitude=aggregates['lon_mean'],
+            zoom=12,
+            pitch=0,
+        )
+
+        tabs2 = st.tabs(["Pickups and Dropoffs", "Time", "Zones"])
+
+        with tabs2[0]:
+            trips = pd.DataFrame([
+                dict(aggregates['longest'], label='Longest Trip', line_width=7, color=[255, 0, 0]),
+                dict(aggregates['shortest'], label='Shortest Trip', line_width=5, color=[0, 255, 0]),
+            ])
+
+            st.subheader("Longest and Shortest Trips")
+            st.write("This visualization displays the longest trip in red and the shortest trip in green.")
+            st.pydeck_chart(CompactDeck(
+                initial_view_state=view_state,
+                layers=[
+                    map_layer(
+                        'LineLayer',
+                        trips,
+                        get_source_position='[start_lon, start_lat]',
+                        get_target_position='[end_lon, end_lat]',
+                        get_color='color',
+                        get_width='line_width',
+                        pickable=True,
+                        tooltip={
+                            "html": "<b>{label}</b>",
+                            "style": {"color": "black"},
+                        },
+                    ),
+                ],
+            ))
+            st.info("Point samples and trip lines need the full data in memory and are not shown in streaming mode.")
+
+        with tabs2[1]:
+            st.subheader("Histogram of Trips by Hour")
+            st.write("This histogram shows the number of trips taken during each hour of the day, revealing peak activity times.")
+            st.bar_chart(aggregates['hourly'])
+            st.info("Trip durations need the full data in memory and are not shown in streaming mode.")
+
+        with tabs2[2]:
+            cells = aggregates['cells']
+
+            st.subheader("Density Heatmap of Trips")
+            st.write("This heatmap shows the density of trips, highlighting the busiest areas in New York City.")
+            st.pydeck_chart(CompactDeck(
+                initial_view_state=view_state,
+                layers=[
+                    map_layer(
+                        'HeatmapLayer',
+                        cells,
+                        get_position='[Lon, Lat]',
+                        auto_highlight=True,
+                        get_weight='count',
+                        radius_pixels=50,
+                    ),
+                ],
+            ))
+
+            st.subheader("Clusters of Most Popular Pickup and Dropoff Areas")
+            st.write("This visualization clusters the most popular pickup and dropoff areas, allowing users to explore the frequency of trips in different zones.")
+            st.pydeck_chart(CompactDeck(
+                initial_view_state=view_state,
+                layers=[
+                    map_layer(
+                        'HexagonLayer',
+                        cells,
+                        get_position='[Lon, Lat]',
+                        get_elevation_weight='count',
+                        get_color_weight='count',
+                        elevation_aggregation='SUM',
+                        color_aggregation='SUM',
+                        radius=100,
+                        opacity=0.6,
+                        elevation_range=[0, 1000],
+                        elevation_scale=4,
+                        pickable=True,
+                        extruded=True,
+                        tooltip=True,
+                    ),
+                ],
+            ))
+
+            st.subheader("Popular Pickup and Dropoff Areas")
+            st.write("This map displays clusters of the most popular pickup and dropoff areas in NYC.")
+            st.pydeck_chart(CompactDeck(
+                initial_view_state=view_state,
+                layers=[
+                    map_layer(
+                        "ScatterplotLayer",
+                        cells.nlargest(40, 'count').rename(columns={'count': 'Frequency'}),
+                        get_position='[Lon, Lat]',
+                        get_fill_color='[255, 255, 255, 25]',
+                        get_radius=600,
+                        pickable=True,
+                        tooltip={
+                            "html": "<b>Pickup Area</b><br/>Frequency: {Frequency}",
+                            "style": {"color": "black"},
+                        },
+                    ),
+                ],
+            ))
+
+        st.stop()
+
+    start_date, end_date = uber_date_range_input()
+    version = uber_version(start_date, end_date)
+    data = load_uber_version(version)
+    if data.empty:
+        st.warning("No trips were recorded in the selected date range.")
+        st.stop()
+
+    days_shown, hours_shown = uber_time_filter_input(start_date, end_date)
+    view = time_view(version, days_shown, hours_shown)
+
+    use_sql = sql_backend_toggle()
+
     tabs2 = st.tabs(["Pickups and Dropoffs", "Time", "Zones"])
 
     with tabs2[0]:
         st.write("Let's get started.")
         
     
-        data['next_lat'] = data['Lat'].shift(-1)
-        data['next_lon'] = data['Lon'].shift(-1)
-
-        data.dropna(subset=['next_lat', 'next_lon'], inplace=True)
-
-        data['distance'] = ((data['next_lat'] - data['Lat']) ** 2 + (data['next_lon'] - data['Lon']) ** 2) ** 0.5
-
-        longest_trip_index = data['distance'].idxmax()
-        shortest_trip_index = data['distance'].idxmin()
-
-        if data['distance'].min() == 0:
-            shortest_trip_index = data[data['distance'] > 0]['distance'].idxmin()
+        data = uber_derived(version, 'trips')
 
-        longest_trip = data.loc[longest_trip_index]
-        shortest_trip = data.loc[shortest_trip_index]
-
-        trips = pd.DataFrame({
-            'start_lat': [longest_trip['Lat'], shortest_trip['Lat']],
-            'start_lon': [longest_trip['Lon'], shortest_trip['Lon']],
-            'end_lat': [longest_trip['next_lat'], shortest_trip['next_lat']],
-            'end_lon': [longest_trip['next_lon'], shortest_trip['next_lon']],
-            'label': ['Longest Trip', 'Shortest Trip'],
-            'line_width': [7, 5],  
-            'color': [[255, 0, 0], [0, 255, 0]] 
-        })
+        trip_count = st.slider("Number of longest and shortest trips:", 1, 10, 1)
 
         st.subheader("Longest and Shortest Trips")
-        st.write("This visualization displays the longest trip in red and the shortest trip in green.")
-        deck1 = pdk.Deck(
-            initial_view_state=pdk.ViewState(
-                latitude=data['Lat'].mean(),
-                longitude=data['Lon'].mean(),
-                zoom=12,
-                pitch=0,
-            ),
-            layers=[
-                pdk.Layer(
-                    'LineLayer',
-                    data=trips,
-                    get_source_position='[start_lon, start_lat]',
-                    get_target_position='[end_lon, end_lat]',
-                    get_color='color',
-                    get_width='line_width',
-                    pickable=True,
-                    tooltip={
-                        "html": "<b>{label}</b>",
-                        "style": {"color": "black"},
-                    },
+        st.write("This visualization displays the longest trips in red and the shortest trips in green.")
+        chart = ChartArtifact('trip_extremes', version, trips=trip_count, view=view)
+        if chart.missing:
+            longest_trips, shortest_trips = trip_extremes(version, trip_count, view)
+
+            trips = pd.concat([
+                longest_trips.assign(label='Longest Trip', line_width=7, color=[[255, 0, 0]] * len(longest_trips)),
+                shortest_trips.assign(label='Shortest Trip', line_width=5, color=[[0, 255, 0]] * len(shortest_trips)),
+            ], ignore_index=True)
+
+            deck1 = CompactDeck(
+                initial_view_state=pdk.ViewState(
+                    latitude=uber_derived(version, 'lat_mean'),
+                    longitude=uber_derived(version, 'lon_mean'),
+                    zoom=12,
+                    pitch=0,
                 ),
-            ],
-        )
-
-        st.pydeck_chart(deck1)
+                layers=[
+                    map_layer(
+                        'LineLayer',
+                        trips,
+                        get_source_position='[start_lon, start_lat]',
+                        get_target_position='[end_lon, end_lat]',
+                        get_color='color',
+                        get_width='line_width',
+                        pickable=True,
+                        tooltip={
+                            "html": "<b>{label}</b>",
+                            "style": {"color": "black"},
+                        },
+                    ),
+                ],
+            )
+            chart.save(deck1)
+        chart.show()
 
         st.subheader("Pickup and Dropoff Points")
         st.write("This map displays pickup points in blue and dropoff points in red randomly selected from the dataset.")
 
-        pickup_data = data[['Lat', 'Lon']].sample(150, random_state=42).copy()  
-        pickup_data['color'] = 'blue'  
-        dropoff_data = data[['next_lat', 'next_lon']].sample(150, random_state=42).copy() 
-        dropoff_data.columns = ['Lat', 'Lon']
-        dropoff_data['color'] = 'red'  
-
-        pickup_data['type'] = 'Pickup'
-        dropoff_data['type'] = 'Dropoff'
-        points = pd.concat([pickup_data, dropoff_data], ignore_index=True)
-
-        deck2 = pdk.Deck(
-            initial_view_state=pdk.ViewState(
-                latitude=data['Lat'].mean(),
-                longitude=data['Lon'].mean(),
-                zoom=12,
-                pitch=0,
-            ),
-            layers=[
-                pdk.Layer(
-                    "ScatterplotLayer",
-                    data=pickup_data,
-                    get_position='[Lon, Lat]',
-                    get_fill_color='[0, 0, 255]',  
-                    get_radius=100,
-                    pickable=True,
-                    tooltip={
-                        "html": "Pickup Point",
-                        "style": {"color": "black"},
-                    },
-                ),
-                pdk.Layer(
-                    "ScatterplotLayer",
-                    data=dropoff_data,
-                    get_position='[Lon, Lat]',
-                    get_fill_color='[255, 0, 0]', 
-                    get_radius=100,
-                    pickable=True,
-                    tooltip={
-                        "html": "Dropoff Point",
-                        "style": {"color": "black"},
-                    },
+        col1, col2 = st.columns(2)
+        sample_size = col1.select_slider("Sample size:", options=SAMPLE_SIZES, value=150)
+        sample_strata = col2.radio("Sample drawn:", list(SAMPLE_STRATA), horizontal=True)
+        sample = sample_positions(version, sample_size, sample_strata, view)
+
+        chart = ChartArtifact('sample_points', version, size=sample_size, strata=sample_strata, view=view)
+        if chart.missing:
+            sample_trips = data.iloc[sample]
+            pickup_data = sample_trips[['Lat', 'Lon']].copy()
+            pickup_data['color'] = 'blue'
+            dropoff_data = sample_trips[['next_lat', 'next_lon']].copy()
+            dropoff_data.columns = ['Lat', 'Lon']
+            dropoff_data['color'] = 'red'
+
+            pickup_data['type'] = 'Pickup'
+            dropoff_data['type'] = 'Dropoff'
+            points = pd.concat([pickup_data, dropoff_data], ignore_index=True)
+
+            deck2 = CompactDeck(
+                initial_view_state=pdk.ViewState(
+                    latitude=uber_derived(version, 'lat_mean'),
+                    longitude=uber_derived(version, 'lon_mean'),
+                    zoom=12,
+                    pitch=0,
                 ),
-            ],
-        )
-
-        st.pydeck_chart(deck2)
+                layers=[
+                    map_layer(
+                        "ScatterplotLayer",
+                        pickup_data,
+                        get_position='[Lon, Lat]',
+                        get_fill_color='[0, 0, 255]',
+                        get_radius=100,
+                        pickable=True,
+                        tooltip={
+                            "html": "Pickup Point",
+                            "style": {"color": "black"},
+                        },
+                    ),
+                    map_layer(
+                        "ScatterplotLayer",
+                        dropoff_data,
+                        get_position='[Lon, Lat]',
+                        get_fill_color='[255, 0, 0]',
+                        get_radius=100,
+                        pickable=True,
+                        tooltip={
+                            "html": "Dropoff Point",
+                            "style": {"color": "black"},
+                        },
+                    ),
+                ],
+            )
+            chart.save(deck2)
+        chart.show()
 
         st.subheader("Trip Lines from Pickup to Dropoff")
-        st.write("This map shows fine lines indicating the trips from pickup to dropoff for 100 random samples.")
+        st.write(f"This map shows fine lines indicating the trips from pickup to dropoff for {sample_size} random samples.")
 
-        sample_trips = data.sample(100, random_state=42)
+        chart = ChartArtifact('sample_lines', version, size=sample_size, strata=sample_strata, view=view)
+        if chart.missing:
+            sample_trips = data.iloc[sample]
 
-        trip_lines = pd.DataFrame({
-            'start_lat': sample_trips['Lat'],
-            'start_lon': sample_trips['Lon'],
-            'end_lat': sample_trips['next_lat'],
-            'end_lon': sample_trips['next_lon'],
-        })
+            trip_lines = pd.DataFrame({
+                'start_lat': sample_trips['Lat'],
+                'start_lon': sample_trips['Lon'],
+                'end_lat': sample_trips['next_lat'],
+                'end_lon': sample_trips['next_lon'],
+            })
 
-        deck3 = pdk.Deck(
-            initial_view_state=pdk.ViewState(
-                latitude=data['Lat'].mean(),
-                longitude=data['Lon'].mean(),
-                zoom=12,
-                pitch=0,
-            ),
-            layers=[
-                pdk.Layer(
-                    'LineLayer',
-                    data=trip_lines,
-                    get_source_position='[start_lon, start_lat]',
-                    get_target_position='[end_lon, end_lat]',
-                    get_color='[0, 0, 255]',  
-                    get_width=2,
-                    pickable=True,
-                    tooltip={
-                        "html": "Trip from Pickup to Dropoff",
-                        "style": {"color": "black"},
-                    },
+            deck3 = CompactDeck(
+                initial_view_state=pdk.ViewState(
+                    latitude=uber_derived(version, 'lat_mean'),
+                    longitude=uber_derived(version, 'lon_mean'),
+                    zoom=12,
+                    pitch=0,
                 ),
-            ],
-        )
-
-        st.pydeck_chart(deck3)
+                layers=[
+                    map_layer(
+                        'LineLayer',
+                        trip_lines,
+                        get_source_position='[start_lon, start_lat]',
+                        get_target_position='[end_lon, end_lat]',
+                        get_color='[0, 0, 255]',
+                        get_width=2,
+                        pickable=True,
+                        tooltip={
+                            "html": "Trip from Pickup to Dropoff",
+                            "style": {"color": "black"},
+                        },
+                    ),
+                ],
+            )
+            chart.save(deck3)
+        chart.show()
+
+        st.subheader("Trip Flows Between Areas")
+        st.write("This map shows the busiest flows between areas, counted over every trip; wider arcs carry more trips.")
+        col1, col2 = st.columns(2)
+        flow_size = col1.select_slider("Flow cell size (metres):", options=[250, 500, 1000, 2000], value=500)
+        flow_count = col2.slider("Number of flows:", 50, 500, 200, step=50)
+
+        chart = ChartArtifact('flows', version, cell_size=flow_size, flows=flow_count, view=view)
+        if chart.missing:
+            flows = top_flows(version, flow_size / METRES_PER_DEGREE, flow_count, view)
+            peak = int(flows['count'].max()) if len(flows) else 1
+
+            deck_flows = CompactDeck(
+                initial_view_state=pdk.ViewState(
+                    latitude=uber_derived(version, 'lat_mean'),
+                    longitude=uber_derived(version, 'lon_mean'),
+                    zoom=11,
+                    pitch=40,
+                ),
+                layers=[
+                    map_layer(
+                        'ArcLayer',
+                        flows,
+                        get_source_position='[start_lon, start_lat]',
+                        get_target_position='[end_lon, end_lat]',
+                        get_source_color='[0, 0, 255, 160]',
+                        get_target_color='[255, 0, 0, 160]',
+                        get_width=f'1 + count * {9 / peak}',
+                        pickable=True,
+                    ),
+                ],
+                tooltip={"text": "{count} trips"},
+            )
+            chart.save(deck_flows)
+        chart.show()
 
     with tabs2[1]:
         st.subheader("Histogram of Trips by Hour")
         st.write("This histogram shows the number of trips taken during each hour of the day, revealing peak activity times.")
-        data['hour'] = data['Date/Time'].dt.hour
-        hourly_trips = data['hour'].value_counts().sort_index()
+        col1, col2 = st.columns(2)
+        selected_weekdays = col1.multiselect("Weekdays:", WEEKDAYS, default=WEEKDAYS)
+        base_names = list(data['Base'].cat.categories)
+        selected_bases = col2.multiselect("Bases:", base_names, default=base_names)
+        selected_days = st.slider("Days of the month:", 1, 31, (1, 31))
+        weekday_numbers = [WEEKDAYS.index(weekday) for weekday in selected_weekdays]
+
+        if use_sql:
+            hourly_trips = uber_hourly_counts(uber_parquet_files(), *days_shown,
+                                              weekday_numbers, selected_days, selected_bases, hours_shown)
+        else:
+            hourly_trips = hourly_counts(version, weekday_numbers, selected_days, selected_bases, view)
 
         st.bar_chart(hourly_trips)
 
-        data['Dropoff Time'] = data['Date/Time'] + pd.to_timedelta(np.random.randint(5, 60, data.shape[0]), unit='m')
+        duration_histogram = uber_derived_in_view(version, view, 'duration_histogram')
 
-        data['Trip Duration'] = (data['Dropoff Time'] - data['Date/Time']).dt.total_seconds() / 60  
-
-        average_trip_duration = data['Trip Duration'].mean()
+        average_trip_duration = duration_histogram['mean']
 
         st.subheader("Trip Duration Histogram")
         st.write("This histogram shows the distribution of trip durations in minutes.")
-        st.write(f"The average trip duration is {average_trip_duration:.2f} minutes.")
 
-        plt.figure(figsize=(10, 6))
-        sns.histplot(data['Trip Duration'], bins=30, kde=True)
-        plt.title("Distribution of Trip Durations")
-        plt.xlabel("Duration (minutes)")
-        plt.ylabel("Frequency")
-        st.pyplot(plt)
+        if duration_histogram['total'] == 0:
+            st.info("No trips in this window.")
+        else:
+            st.write(f"The average trip duration is {average_trip_duration:.2f} minutes.")
+
+            chart = ChartArtifact('duration_histogram', version, view=view)
+            if chart.missing:
+                plt.figure(figsize=(10, 6))
+                edges = duration_histogram['edges']
+                sns.histplot(x=edges[:-1], weights=duration_histogram['counts'], bins=edges.tolist(), alpha=0.5)
+                plt.plot(duration_histogram['grid'], duration_histogram['density'] * duration_histogram['total'] * (edges[1] - edges[0]))
+                plt.title("Distribution of Trip Durations")
+                plt.xlabel("Duration (minutes)")
+                plt.ylabel("Frequency")
+                chart.save(plt)
+            chart.show()
 
     with tabs2[2]:
-        data['next_lat'] = data['Lat'].shift(-1)
-        data['next_lon'] = data['Lon'].shift(-1)
-
-        data.dropna(subset=['next_lat', 'next_lon'], inplace=True)
-
         st.subheader("Density Heatmap of Trips")
         st.write("This heatmap shows the density of trips, highlighting the busiest areas in New York City.")
-        half_data = data.sample(frac=0.4, random_state=42) 
-
-        deck4 = pdk.Deck(
-            initial_view_state=pdk.ViewState(
-                latitude=half_data['Lat'].mean(),
-                longitude=half_data['Lon'].mean(),
-                zoom=12,
-                pitch=0,
-            ),
-            layers=[
-                pdk.Layer(
-                    'HeatmapLayer',
-                    data=half_data,
-                    get_position='[Lon, Lat]',
-                    auto_highlight=True,
-                    get_weight='1',
-                    radius_pixels=50,
+        cell_size = st.select_slider("Heatmap cell size (metres):", options=[50, 100, 250, 500, 1000], value=100)
+        chart = ChartArtifact('heatmap', version, cell_size=cell_size, view=view)
+        if chart.missing:
+            heatmap_cells = grid_cells(version, cell_size / METRES_PER_DEGREE, view)
+
+            deck4 = CompactDeck(
+                initial_view_state=pdk.ViewState(
+                    latitude=uber_derived(version, 'lat_mean'),
+                    longitude=uber_derived(version, 'lon_mean'),
+                    zoom=12,
+                    pitch=0,
                 ),
-            ],
-        )
-
-        st.pydeck_chart(deck4)
+                layers=[
+                    map_layer(
+                        'HeatmapLayer',
+                        heatmap_cells,
+                        get_position='[Lon, Lat]',
+                        auto_highlight=True,
+                        get_weight='count',
+                        radius_pixels=50,
+                    ),
+                ],
+            )
+            chart.save(deck4)
+        chart.show()
 
         st.subheader("Clusters of Most Popular Pickup and Dropoff Areas")
         st.write("This visualization clusters the most popular pickup and dropoff areas, allowing users to explore the frequency of trips in different zones.")
 
-        cluster_data = data[['Lat', 'Lon']].sample(1000, random_state=42)
-
-        deck5 = pdk.Deck(
-            initial_view_state=pdk.ViewState(
-                latitude=cluster_data['Lat'].mean(),
-                longitude=cluster_data['Lon'].mean(),
-                zoom=12,
-                pitch=0,
-            ),
-            layers=[
-                pdk.Layer(
-                    'HexagonLayer',
-                    data=cluster_data,
-                    get_position='[Lon, Lat]',
-                    radius=100,
-                    opacity=0.6,
-                    elevation_range=[0, 1000],
-                    elevation_scale=4,
-                    pickable=True,
-                    extruded=True,
-                    tooltip=True,
+        hex_radius = st.select_slider("Hexagon radius (metres):", options=HEX_RADII, value=100)
+        chart = ChartArtifact('hexagons', version, radius=hex_radius, view=view)
+        if chart.missing:
+            hexagons = uber_derived_in_view(version, view, 'hexagons')[hex_radius]
+            peak = int(hexagons['count'].max()) if len(hexagons) else 1
+
+            deck5 = CompactDeck(
+                initial_view_state=pdk.ViewState(
+                    latitude=uber_derived(version, 'lat_mean'),
+                    longitude=uber_derived(version, 'lon_mean'),
+                    zoom=12,
+                    pitch=0,
                 ),
-            ],
-        )
-
-        st.pydeck_chart(deck5)
+                layers=[
+                    map_layer(
+                        'ColumnLayer',
+                        hexagons,
+                        get_position='[Lon, Lat]',
+                        get_elevation=f'count * {4000 / peak}',
+                        get_fill_color=f'[255, 255 - count * {255 / peak}, 0]',
+                        radius=hex_radius,
+                        disk_resolution=6,
+                        coverage=0.95,
+                        opacity=0.6,
+                        pickable=True,
+                        extruded=True,
+                    ),
+                ],
+                tooltip={"text": "{count} pickups and dropoffs"},
+            )
+            chart.save(deck5)
+        chart.show()
 
 
         st.subheader("Popular Pickup and Dropoff Areas")
         st.write("This map displays clusters of the most popular pickup and dropoff areas in NYC.")
 
-        pickup_counts = data.groupby(['Lat', 'Lon']).size().reset_index(name='Frequency')
-        dropoff_counts = data.groupby(['next_lat', 'next_lon']).size().reset_index(name='Frequency')
-
-        pickup_counts['Type'] = 'Pickup'
-        dropoff_counts['Type'] = 'Dropoff'
-        combined_counts = pd.concat([pickup_counts, dropoff_counts], ignore_index=True)
-
-        top_pickups = pickup_counts.nlargest(40, 'Frequency')
-        top_dropoffs = dropoff_counts.nlargest(40, 'Frequency')
-
-        cluster_data = pd.concat([top_pickups, top_dropoffs], ignore_index=True)
-
-        deck5 = pdk.Deck(
-            initial_view_state=pdk.ViewState(
-                latitude=data['Lat'].mean(),
-                longitude=data['Lon'].mean(),
-                zoom=12,
-                pitch=0,
-            ),
-            layers=[
-                pdk.Layer(
-                    "ScatterplotLayer",
-                    data=top_pickups,
-                    get_position='[Lon, Lat]',
-                    get_fill_color='[255, 255, 255, 25]',  
-                    get_radius=600,  
-                    pickable=True,
-                    tooltip={
-                        "html": "<b>Pickup Area</b><br/>Frequency: {Frequency}",
-                        "style": {"color": "black"},
-                    },
+        hotspot_size = st.select_slider("Hotspot cell size (metres):", options=[50, 100, 250, 500, 1000], value=100)
+        hotspot_resolution = hotspot_size / METRES_PER_DEGREE
+
+        chart = ChartArtifact('hotspots', version, cell_size=hotspot_size, sql=use_sql, view=view)
+        if chart.missing:
+            if use_sql:
+                top_pickups, top_dropoffs = uber_location_counts(uber_parquet_files(), start_date, end_date, hotspot_resolution,
+                                                                 days=days_shown, hours=hours_shown)
+            else:
+                top_pickups, top_dropoffs = hotspots(version, hotspot_resolution, view=view)
+
+            deck5 = CompactDeck(
+                initial_view_state=pdk.ViewState(
+                    latitude=uber_derived(version, 'lat_mean'),
+                    longitude=uber_derived(version, 'lon_mean'),
+                    zoom=12,
+                    pitch=0,
                 ),
-                pdk.Layer(
-                    "ScatterplotLayer",
-                    data=top_dropoffs,
-                    get_position='[next_lon, next_lat]',
-                    get_fill_color='[255, 255, 255, 25]',  
-                    get_radius=600,  
-                    pickable=True,
-                    tooltip={
-                        "html": "<b>Dropoff Area</b><br/>Frequency: {Frequency}",
-                        "style": {"color": "black"},
-                    },
+                layers=[
+                    map_layer(
+                        "ScatterplotLayer",
+                        top_pickups,
+                        get_position='[Lon, Lat]',
+                        get_fill_color='[255, 255, 255, 25]',
+                        get_radius=600,
+                        pickable=True,
+                        tooltip={
+                            "html": "<b>Pickup Area</b><br/>Frequency: {Frequency}",
+                            "style": {"color": "black"},
+                        },
+                    ),
+                    map_layer(
+                        "ScatterplotLayer",
+                        top_dropoffs,
+                        get_position='[next_lon, next_lat]',
+                        get_fill_color='[255, 255, 255, 25]',
+                        get_radius=600,
+                        pickable=True,
+                        tooltip={
+                            "html": "<b>Dropoff Area</b><br/>Frequency: {Frequency}",
+                            "style": {"color": "black"},
+                        },
+                    ),
+                ],
+            )
+            chart.save(deck5)
+        chart.show()
+
+
+        st.subheader("Pickups Around a Point")
+        st.write("Enter a point and a radius to count the pickups around it and see at which hours they happen.")
+        col1, col2, col3 = st.columns(3)
+        query_lat = col1.number_input("Latitude:", value=round(uber_derived(version, 'lat_mean'), 4), format="%.4f")
+        query_lon = col2.number_input("Longitude:", value=round(uber_derived(version, 'lon_mean'), 4), format="%.4f")
+        query_radius = col3.number_input("Radius (metres):", min_value=50, max_value=5000, value=500, step=50)
+        nearby = pickups_within(version, query_lat, query_lon, query_radius, view)
+        st.write(f"{len(nearby):,} pickups within {query_radius} m of this point.")
+
+        hourly_nearby = pd.Series(np.bincount(uber_derived(version, 'hour')[nearby], minlength=24),
+                                  index=pd.RangeIndex(24, name='hour'), name='count')
+        st.bar_chart(hourly_nearby)
+
+        chart = ChartArtifact('pickups_around', version, lat=query_lat, lon=query_lon, radius=query_radius, view=view)
+        if chart.missing:
+            query_zoom = zoom_for_radius(query_lat, query_radius)
+            in_view = pickups_in_view(version, *viewport_bounds(query_lat, query_lon, query_zoom), view)
+            pickups = load_uber_version(version)
+            deck6 = CompactDeck(
+                initial_view_state=pdk.ViewState(
+                    latitude=query_lat,
+                    longitude=query_lon,
+                    zoom=query_zoom,
+                    pitch=0,
                 ),
-            ],
-        )
-
-        st.pydeck_chart(deck5)
+                layers=[
+                    map_layer(
+                        "ScatterplotLayer",
+                        pickups.iloc[np.setdiff1d(in_view, nearby, assume_unique=True)],
+                        get_position='[Lon, Lat]',
+                        get_fill_color='[160, 160, 160, 120]',
+                        get_radius=10,
+                    ),
+                    map_layer(
+                        "ScatterplotLayer",
+                        pickups.iloc[nearby],
+                        get_position='[Lon, Lat]',
+                        get_fill_color='[255, 0, 0, 160]',
+                        get_radius=10,
+                    ),
+                ],
+            )
+            chart.save(deck6)
+        chart.show()
 
 
 
@@ -637,7 +869,9 @@ elif selected == "RGA Analysis":
 
 
 
-    df = pd.read_csv('guns.csv', sep=',', encoding='ISO-8859-1')
+    df = load_guns_data().copy(deep=False)
+    dataset = guns_version()
+    counts = load_guns_counts()
 
 
 
@@ -717,18 +951,22 @@ elif selected == "RGA Analysis":
         By visualizing the frequency of each family, we can identify which types of firearms are more common.
         """)
 
-        plt.figure(figsize=(10, 6))
-        ax = sns.countplot(y="famille", data=df, palette="viridis", order=df["famille"].value_counts().index)
-        
-        for p in ax.patches:
-            count = int(p.get_width())  
-            ax.annotate(f'{count}', (p.get_width() + 100, p.get_y() + p.get_height() / 2), 
-                        va='center')  
+        famille_counts = rga_count(counts, 'famille')
+        chart = ChartArtifact('famille', famille_counts)
+        if chart.missing:
+            plt.figure(figsize=(10, 6))
+            ax = sns.barplot(x=famille_counts.values, y=famille_counts.index, palette="viridis", order=famille_counts.index)
 
-        plt.title('Distribution of Firearm Families')
-        plt.xlabel('Count')
-        plt.ylabel('Firearm Family')
-        st.pyplot(plt)
+            for p in ax.patches:
+                count = int(p.get_width())
+                ax.annotate(f'{count}', (p.get_width() + 100, p.get_y() + p.get_height() / 2),
+                            va='center')
+
+            plt.title('Distribution of Firearm Families')
+            plt.xlabel('Count')
+            plt.ylabel('Firearm Family')
+            chart.save(plt)
+        chart.show()
 
     #VISU 2
     
@@ -739,36 +977,41 @@ elif selected == "RGA Analysis":
         and this allows us to see how types are distributed across families.
         """)
 
-        plt.figure(figsize=(16, 10))  
-
-        ax = sns.countplot(y="typeArme", data=df, hue="famille", palette="viridis",
-                        order=df["typeArme"].value_counts().index)
-
-        for p in ax.patches:
-            count = int(p.get_width())  
-            ax.annotate(f'{count}', (p.get_width() + 50, p.get_y() + p.get_height() / 2),
-                        va='center', fontsize=12)  
+        type_counts = rga_pair_count(counts, 'typeArme', 'famille').reset_index()
+        chart = ChartArtifact('typeArme_famille', type_counts)
+        if chart.missing:
+            plt.figure(figsize=(16, 10))
 
-        ax.legend(title="Firearm Family", loc='lower right', bbox_to_anchor=(1, 0), fontsize=12, title_fontsize=14)
+            ax = sns.barplot(data=type_counts, x="count", y="typeArme", hue="famille", palette="viridis",
+                             order=rga_count(counts, "typeArme").index, hue_order=sorted(type_counts['famille'].unique()))
 
-        plt.title('Distribution of Firearm Types by Family', fontsize=18)
-        plt.xlabel('Count', fontsize=14)
-        plt.ylabel('Firearm Type', fontsize=14)
+            for p in ax.patches:
+                count = int(p.get_width())
+                ax.annotate(f'{count}', (p.get_width() + 50, p.get_y() + p.get_height() / 2),
+                            va='center', fontsize=12)
 
-        ax.tick_params(axis='x', labelsize=12)
-        ax.tick_params(axis='y', labelsize=12)
+            ax.legend(title="Firearm Family", loc='lower right', bbox_to_anchor=(1, 0), fontsize=12, title_fontsize=14)
 
-        st.pyplot(plt)
+            plt.title('Distribution of Firearm Types by Family', fontsize=18)
+            plt.xlabel('Count', fontsize=14)
+            plt.ylabel('Firearm Type', fontsize=14)
 
-        top_families = df['typeArme'].value_counts().nlargest(5)
+            ax.tick_params(axis='x', labelsize=12)
+            ax.tick_params(axis='y', labelsize=12)
+            chart.save(plt)
+        chart.show()
 
-        plt.figure(figsize=(8, 8))  
+        top_families = rga_count(counts, 'typeArme').nlargest(5)
 
-        plt.pie(top_families, labels=top_families.index, autopct='%1.1f%%', startangle=90, colors=sns.color_palette('viridis', 5))
+        chart = ChartArtifact('top_families', top_families)
+        if chart.missing:
+            plt.figure(figsize=(8, 8))
 
-        plt.title("Top 5 Firearm Families by Occurrence", fontsize=16)
+            plt.pie(top_families, labels=top_families.index, autopct='%1.1f%%', startangle=90, colors=sns.color_palette('viridis', 5))
 
-        st.pyplot(plt)
+            plt.title("Top 5 Firearm Families by Occurrence", fontsize=16)
+            chart.save(plt)
+        chart.show()
 
 
     #VISU 3
@@ -779,20 +1022,22 @@ elif selected == "RGA Analysis":
         highlighting the relative frequency of different brands in the dataset.
         """)
 
-        brand_counts = df['marque'].value_counts()
+        brand_counts = rga_count(counts, 'marque')
 
-        plt.figure(figsize=(12, 8))  
-        bars = plt.barh(brand_counts.index[:10], brand_counts.values[:10], color='skyblue')  
+        chart = ChartArtifact('brands', brand_counts.head(10))
+        if chart.missing:
+            plt.figure(figsize=(12, 8))
+            bars = plt.barh(brand_counts.index[:10], brand_counts.values[:10], color='skyblue')
 
-        plt.title("Distribution of Firearms by Brand (Top 10)", fontsize=16)
-        plt.xlabel("Number of Firearms", fontsize=14)
-        plt.ylabel("Brand", fontsize=14)
+            plt.title("Distribution of Firearms by Brand (Top 10)", fontsize=16)
+            plt.xlabel("Number of Firearms", fontsize=14)
+            plt.ylabel("Brand", fontsize=14)
 
-        for bar in bars:
-            plt.text(bar.get_width(), bar.get_y() + bar.get_height()/2, 
-                    int(bar.get_width()), va='center', fontsize=12)
-
-        st.pyplot(plt)
+            for bar in bars:
+                plt.text(bar.get_width(), bar.get_y() + bar.get_height()/2,
+                        int(bar.get_width()), va='center', fontsize=12)
+            chart.save(plt)
+        chart.show()
 
     #VISU 4
         st.subheader("Distribution of Firearms by Manufacturer")
@@ -802,16 +1047,18 @@ elif selected == "RGA Analysis":
         showcasing the proportion of firearms produced by the leading manufacturers in the dataset.
         """)
 
-        manufacturer_counts = df['fabricant'].value_counts()
+        manufacturer_counts = rga_count(counts, 'fabricant')
 
         top_manufacturers = manufacturer_counts.head(5)
 
-        plt.figure(figsize=(10, 8))  
-        plt.pie(top_manufacturers, labels=top_manufacturers.index, autopct='%1.1f%%', startangle=140, colors=plt.cm.tab10.colors)
-        
-        plt.title("Distribution of Firearms by Manufacturer", fontsize=16)
+        chart = ChartArtifact('top_manufacturers', top_manufacturers)
+        if chart.missing:
+            plt.figure(figsize=(10, 8))
+            plt.pie(top_manufacturers, labels=top_manufacturers.index, autopct='%1.1f%%', startangle=140, colors=plt.cm.tab10.colors)
 
-        st.pyplot(plt)
+            plt.title("Distribution of Firearms by Manufacturer", fontsize=16)
+            chart.save(plt)
+        chart.show()
 
 
     #VISU 5
@@ -822,23 +1069,25 @@ elif selected == "RGA Analysis":
         highlighting the number of firearms produced in each country.
         """)
 
-        country_counts = df['paysFabricant'].value_counts().reset_index()
+        country_counts = rga_count(counts, 'paysFabricant').reset_index()
         country_counts.columns = ['Country', 'Number of Firearms']
 
-        fig = px.choropleth(country_counts, 
-                            locations='Country',
-                            locationmode='country names',
-                            color='Number of Firearms',
-                            hover_name='Country',
-                            color_continuous_scale=px.colors.sequential.Plasma,
-                            title='Number of Firearms Produced by Country',
-                            labels={'Number of Firearms': 'Number of Firearms'},
-                            projection='natural earth')
+        chart = ChartArtifact('country_map', country_counts)
+        if chart.missing:
+            fig = px.choropleth(country_counts,
+                                locations='Country',
+                                locationmode='country names',
+                                color='Number of Firearms',
+                                hover_name='Country',
+                                color_continuous_scale=px.colors.sequential.Plasma,
+                                title='Number of Firearms Produced by Country',
+                                labels={'Number of Firearms': 'Number of Firearms'},
+                                projection='natural earth')
 
-        fig.update_layout(title_font_size=20,
-                        geo=dict(showland=True, landcolor='lightgray'))
-
-        st.plotly_chart(fig)
+            fig.update_layout(title_font_size=20,
+                            geo=dict(showland=True, landcolor='lightgray'))
+            chart.save(fig)
+        chart.show()
 
 
 
@@ -854,31 +1103,29 @@ elif selected == "RGA Analysis":
         illustrating the number of firearms created each year.
         """)
 
-        df['dateCreaRGA'] = pd.to_datetime(df['dateCreaRGA'], errors='coerce')
-        df['Year'] = df['dateCreaRGA'].dt.year
-
-        yearly_counts = df['Year'].value_counts().reset_index()
+        yearly_counts = rga_count(counts, 'yearCreated').reset_index()
         yearly_counts.columns = ['Year', 'Number of Firearms']
         yearly_counts = yearly_counts.sort_values('Year')
 
-        fig = px.line(yearly_counts, 
-                    x='Year', 
-                    y='Number of Firearms', 
-                    title='Number of Firearms Created Over Time',
-                    labels={'Number of Firearms': 'Number of Firearms'},
-                    markers=True)
+        chart = ChartArtifact('yearly_creations', yearly_counts)
+        if chart.missing:
+            fig = px.line(yearly_counts,
+                        x='Year',
+                        y='Number of Firearms',
+                        title='Number of Firearms Created Over Time',
+                        labels={'Number of Firearms': 'Number of Firearms'},
+                        markers=True)
 
-        fig.update_layout(title_font_size=20,
-                        xaxis_title='Year',
-                        yaxis_title='Number of Firearms',
-                        xaxis=dict(tickmode='linear'))
-
-        st.plotly_chart(fig)
+            fig.update_layout(title_font_size=20,
+                            xaxis_title='Year',
+                            yaxis_title='Number of Firearms',
+                            xaxis=dict(tickmode='linear'))
+            chart.save(fig)
+        chart.show()
 
 
     #VISU 7
         st.subheader("Comparison of Creation and Update Dates")
-        df = df[df['dateMajRGA'] >= df['dateCreaRGA']]
 
 
         st.write("""
@@ -887,24 +1134,43 @@ elif selected == "RGA Analysis":
         the last updated date on the y-axis.
         """)
 
-        df['dateCreaRGA'] = pd.to_datetime(df['dateCreaRGA'], errors='coerce')
-        df['dateMajRGA'] = pd.to_datetime(df['dateMajRGA'], errors='coerce')
-
-        scatter_df = df.dropna(subset=['dateCreaRGA', 'dateMajRGA'])
-
-        fig = px.scatter(scatter_df,
-                        x='dateCreaRGA', 
-                        y='dateMajRGA',
-                        title='Comparison of Creation and Update Dates',
-                        labels={'dateCreaRGA': 'Creation Date', 'dateMajRGA': 'Update Date'},
-                        hover_data=['referenceRGA'])  
-
-        fig.update_traces(marker=dict(size=5, opacity=0.7))
-        fig.update_layout(title_font_size=20,
-                        xaxis_title='Creation Date',
-                        yaxis_title='Update Date')
-
-        st.plotly_chart(fig)
+        created_first, created_last, updated_first, updated_last = date_bounds(dataset)
+        col1, col2 = st.columns(2)
+        created_range = col1.slider("Creation dates:", created_first, created_last, (created_first, created_last))
+        updated_range = col2.slider("Update dates:", updated_first, updated_last, (updated_first, updated_last))
+        date_range = created_range + updated_range
+        picks = date_window(dataset, date_range, consistent_only=True)
+
+        chart = ChartArtifact('creation_update_dates', dataset, consistent=True, window=date_range)
+        if chart.missing:
+            if len(picks) <= DATE_POINT_LIMIT:
+                scatter_df = date_points(dataset, picks)
+
+                fig = px.scatter(scatter_df,
+                                x='dateCreaRGA',
+                                y='dateMajRGA',
+                                title='Comparison of Creation and Update Dates',
+                                labels={'dateCreaRGA': 'Creation Date', 'dateMajRGA': 'Update Date'},
+                                hover_data=['referenceRGA'],
+                                render_mode='webgl')
+                fig.update_traces(marker=dict(size=5, opacity=0.7))
+            else:
+                raster = date_raster(dataset, date_range, consistent_only=True)
+                fig = go.Figure(go.Heatmap(x=raster['created'],
+                                           y=raster['updated'],
+                                           z=np.where(raster['counts'] > 0, raster['counts'], np.nan),
+                                           colorscale='Viridis',
+                                           colorbar=dict(title='Firearms'),
+                                           hovertemplate='Creation: %{x}<br>Update: %{y}<br>Firearms: %{z}<extra></extra>'))
+                fig.update_layout(title='Comparison of Creation and Update Dates')
+
+            fig.update_layout(title_font_size=20,
+                            xaxis_title='Creation Date',
+                            yaxis_title='Update Date')
+            chart.save(fig)
+        chart.show()
+        if len(picks) > DATE_POINT_LIMIT:
+            st.caption(f"{len(picks)} firearms shown as density. Narrow the dates to {DATE_POINT_LIMIT} firearms or fewer to see individual points.")
 
 
     #VISU 8
@@ -915,30 +1181,28 @@ elif selected == "RGA Analysis":
         It provides insights into the frequency of updates over time.
         """)
 
-        df['dateMajRGA'] = pd.to_datetime(df['dateMajRGA'], errors='coerce')
-
-        df['year_updated'] = df['dateMajRGA'].dt.year
+        update_counts = rga_count(counts, 'yearUpdated', consistent_only=True).sort_index()
 
-        update_counts = df['year_updated'].value_counts().sort_index()
+        chart = ChartArtifact('yearly_updates', update_counts)
+        if chart.missing:
+            fig = go.Figure()
 
-        fig = go.Figure()
-
-        fig.add_trace(go.Bar(
-            x=update_counts.index, 
-            y=update_counts.values,
-            marker=dict(color='royalblue'),
-            text=update_counts.values,  
-            textposition='outside'       
-        ))
-
-        fig.update_layout(
-            title='Number of Firearms Updated per Year',
-            xaxis_title='Year',
-            yaxis_title='Number of Updates',
-            title_font_size=20
-        )
+            fig.add_trace(go.Bar(
+                x=update_counts.index,
+                y=update_counts.values,
+                marker=dict(color='royalblue'),
+                text=update_counts.values,
+                textposition='outside'
+            ))
 
-        st.plotly_chart(fig)
+            fig.update_layout(
+                title='Number of Firearms Updated per Year',
+                xaxis_title='Year',
+                yaxis_title='Number of Updates',
+                title_font_size=20
+            )
+            chart.save(fig)
+        chart.show()
 
 
     with tabs[3]:
@@ -947,10 +1211,14 @@ elif selected == "RGA Analysis":
 
         st.subheader("Répartition des Armes par Classement")
         st.write("Ce diagramme en secteurs montre la répartition des armes par classement français.")
-        fig_class_rank = px.pie(df, names='classementEuropeen', 
-                                title='Répartition des armes par classement', 
-                                hole=0.3) 
-        st.plotly_chart(fig_class_rank)
+        class_counts = rga_count(counts, 'classementEuropeen', consistent_only=True).reset_index()
+        chart = ChartArtifact('classement_europeen', class_counts)
+        if chart.missing:
+            fig_class_rank = px.pie(class_counts, names='classementEuropeen', values='count',
+                                    title='Répartition des armes par classement',
+                                    hole=0.3)
+            chart.save(fig_class_rank)
+        chart.show()
         st.write(" Catégories d'armes :")
         st.write("- *Catégorie A* : Armes à feu semi-automatiques et de guerre, généralement interdites aux civils.")
         st.write("- *Catégorie B* : Fusils de chasse et armes de tir sportif, nécessitant un permis.")
@@ -963,21 +1231,24 @@ elif selected == "RGA Analysis":
         This KDE plot visualizes the density distribution of firearm lengths. 
         """)
 
-        fig, ax = plt.subplots(figsize=(10, 6))
+        chart = ChartArtifact('length_histogram', dataset, consistent=True)
+        if chart.missing:
+            fig, ax = plt.subplots(figsize=(10, 6))
 
-        sns.histplot(df['longueurArme'], 
-                    bins=50,    
-                    kde=False,  
-                    color="lightblue", 
-                    ax=ax)
+            consistent = df[df['dateMajRGA'] >= df['dateCreaRGA']]
+            sns.histplot(consistent['longueurArme'],
+                        bins=50,
+                        kde=False,
+                        color="lightblue",
+                        ax=ax)
 
-        ax.set_xlim(0, 2000)
+            ax.set_xlim(0, 2000)
 
-        ax.set_title('Firearm Length Distribution', fontsize=16)
-        ax.set_xlabel('Firearm Length (cm)', fontsize=12)
-        ax.set_ylabel('Number of Firearms', fontsize=12)
-
-        st.pyplot(fig)
+            ax.set_title('Firearm Length Distribution', fontsize=16)
+            ax.set_xlabel('Firearm Length (cm)', fontsize=12)
+            ax.set_ylabel('Number of Firearms', fontsize=12)
+            chart.save(fig)
+        chart.show()
 
 
     #VISU 11
@@ -987,28 +1258,29 @@ elif selected == "RGA Analysis":
         This Bubble Chart presents the most common calibers in the dataset. 
         """)
 
-        caliber_counts = df['calibreCanonUn'].value_counts().reset_index()
+        caliber_counts = rga_count(counts, 'calibreCanonUn', consistent_only=True).reset_index()
         caliber_counts.columns = ['calibre', 'count']
-
-        fig_caliber_bubble = px.scatter(
-            caliber_counts,
-            x='calibre',
-            y='count',
-            size='count',
-            color='calibre',
-            title='Analyse du Calibre Principal des Armes',
-            labels={'calibre': 'Calibre Principal', 'count': 'Nombre d\'Armes'},
-            hover_name='calibre',
-            size_max=30,
-            template='plotly_white'
+        chart = ChartArtifact('caliber_bubble', caliber_counts)
+        if chart.missing:
+            fig_caliber_bubble = px.scatter(
+                caliber_counts,
+                x='calibre',
+                y='count',
+                size='count',
+                color='calibre',
+                title='Analyse du Calibre Principal des Armes',
+                labels={'calibre': 'Calibre Principal', 'count': 'Nombre d\'Armes'},
+                hover_name='calibre',
+                size_max=30,
+                template='plotly_white'
+            )
+
+            fig_caliber_bubble.update_layout(
+            width=1500,
+            height=1000
         )
-        
-        fig_caliber_bubble.update_layout(
-        width=1500,  
-        height=1000   
-    )
-
-        st.plotly_chart(fig_caliber_bubble)
+            chart.save(fig_caliber_bubble)
+        chart.show()
         
 
     #VISU 12
@@ -1018,20 +1290,21 @@ elif selected == "RGA Analysis":
         """)
 
 
-        bar_data = df.groupby(['typeCanonUn', 'modePercussionCanonUn']).size().reset_index(name='count')
-
-        fig_cannon_percussion_bar = px.bar(
-            bar_data,
-            x='typeCanonUn',
-            y='count',
-            color='modePercussionCanonUn',
-            barmode='group',
-            title='Types of Cannons VS Percussion Modes',
-            labels={'x': 'Type de Canon', 'y': 'Nombre d\'Armes'},
-            template='plotly_white'
-        )
-
-        st.plotly_chart(fig_cannon_percussion_bar)
+        bar_data = rga_pair_count(counts, 'typeCanonUn', 'modePercussionCanonUn', consistent_only=True).reset_index().sort_values(['typeCanonUn', 'modePercussionCanonUn'])
+        chart = ChartArtifact('cannon_percussion', bar_data)
+        if chart.missing:
+            fig_cannon_percussion_bar = px.bar(
+                bar_data,
+                x='typeCanonUn',
+                y='count',
+                color='modePercussionCanonUn',
+                barmode='group',
+                title='Types of Cannons VS Percussion Modes',
+                labels={'x': 'Type de Canon', 'y': 'Nombre d\'Armes'},
+                template='plotly_white'
+            )
+            chart.save(fig_cannon_percussion_bar)
+        chart.show()
 
 
 
@@ -1039,19 +1312,20 @@ elif selected == "RGA Analysis":
 
         st.subheader("Distribution of Amlimentation Systems")
 
-        donut_data = df['systemeAlimentation'].value_counts().reset_index()
+        donut_data = rga_count(counts, 'systemeAlimentation', consistent_only=True).reset_index()
         donut_data.columns = ['Système d\'Alimentation', 'Nombre d\'Armes']
-
-        fig_donut_chart = px.pie(
-            donut_data,
-            values='Nombre d\'Armes',
-            names='Système d\'Alimentation',
-            title='Répartition des Systèmes d\'Alimentation',
-            hole=0.4,  
-            template='plotly_white'
-        )
-
-        st.plotly_chart(fig_donut_chart)
+        chart = ChartArtifact('alimentation_donut', donut_data)
+        if chart.missing:
+            fig_donut_chart = px.pie(
+                donut_data,
+                values='Nombre d\'Armes',
+                names='Système d\'Alimentation',
+                title='Répartition des Systèmes d\'Alimentation',
+                hole=0.4,
+                template='plotly_white'
+            )
+            chart.save(fig_donut_chart)
+        chart.show()
 
 
 
@@ -1066,13 +1340,30 @@ elif selected == "RGA Analysis":
         into the variation and common lengths within each caliber.
         """)
 
-        unique_calibers = df['calibreCanonUn'].unique()
-        selected_caliber = st.selectbox("Select a Caliber:", sorted(unique_calibers))
-
-        filtered_df = df[df['calibreCanonUn'] == selected_caliber]
-
-        fig_violin_length_caliber = px.violin(filtered_df, x='calibreCanonUn', y='longueurArme', box=True)
-        st.plotly_chart(fig_violin_length_caliber)  
+        calibers = length_calibers(dataset, consistent_only=True)
+        selected_calibers = st.multiselect("Select calibers:", calibers, default=calibers[:1])
+
+        chart = ChartArtifact('caliber_violins', dataset, consistent=True, calibers=selected_calibers)
+        if chart.missing:
+            fig_violin_length_caliber = go.Figure()
+            for position, caliber in enumerate(selected_calibers):
+                stats = caliber_length_stats(dataset, caliber, consistent_only=True)
+                color = px.colors.qualitative.Plotly[position % len(px.colors.qualitative.Plotly)]
+                half_width = 0.4 * stats['density'] / stats['density'].max()
+                fig_violin_length_caliber.add_trace(go.Scatter(
+                    x=np.concatenate([position - half_width, position + half_width[::-1]]),
+                    y=np.concatenate([stats['grid'], stats['grid'][::-1]]),
+                    fill='toself', mode='lines', line=dict(color=color), name=caliber,
+                    hovertemplate=f"{caliber}<br>{stats['count']} firearms<extra></extra>"))
+                fig_violin_length_caliber.add_trace(go.Box(
+                    x=[position], q1=[stats['q1']], median=[stats['median']], q3=[stats['q3']],
+                    lowerfence=[stats['lowerfence']], upperfence=[stats['upperfence']],
+                    width=0.1, marker_color=color, name=caliber, showlegend=False))
+            fig_violin_length_caliber.update_layout(
+                xaxis=dict(tickvals=list(range(len(selected_calibers))), ticktext=selected_calibers),
+                xaxis_title='calibreCanonUn', yaxis_title='longueurArme')
+            chart.save(fig_violin_length_caliber)
+        chart.show()
 
 
 
@@ -1084,19 +1375,20 @@ elif selected == "RGA Analysis":
         providing insights into how these characteristics interact with one another.
         """)
 
-        numeric_df = df.select_dtypes(include=[np.number])
-
-        if numeric_df.empty:
-            st.write("No numeric columns available for correlation.")
-        else:
+        chart = ChartArtifact('correlation', dataset, consistent=True)
+        if chart.missing:
+            consistent = df[df['dateMajRGA'] >= df['dateCreaRGA']]
+            numeric_df = consistent.select_dtypes(include=[np.number]).assign(
+                Year=consistent['dateCreaRGA'].dt.year, year_updated=consistent['dateMajRGA'].dt.year)
             corr = numeric_df.corr()
 
-            fig_corr = px.imshow(corr, title='Heatmap of Correlation', 
+            fig_corr = px.imshow(corr, title='Heatmap of Correlation',
                                 labels=dict(x='Variables', y='Variables', color='Correlation'),
                                 color_continuous_scale='RdBu', zmin=-1, zmax=1)
-            st.plotly_chart(fig_corr)
+            chart.save(fig_corr)
+        chart.show()
 
-            st.write("The heatmap reveals the correlations between various weapon characteristics, highlighting potential relationships such as a strong positive correlation between `capaciteHorsChambre` and `capaciteChambre`. Variables like `longueurArme` and `Year` exhibit little to no correlation, indicating that the length of weapons is largely independent of the year of manufacture.")
+        st.write("The heatmap reveals the correlations between various weapon characteristics, highlighting potential relationships such as a strong positive correlation between `capaciteHorsChambre` and `capaciteChambre`. Variables like `longueurArme` and `Year` exhibit little to no correlation, indicating that the length of weapons is largely independent of the year of manufacture.")
 
 
 
@@ -1104,65 +1396,71 @@ elif selected == "RGA Analysis":
         st.subheader("Repartition of Semi Auto Weapons")
         
 
-        semi_auto_counts = df['armeSemiAutoApparenceArmeAuto'].value_counts().reset_index()
-        semi_auto_counts.columns = ['Appearance', 'Count'] 
-
-        fig_semi_auto = px.bar(semi_auto_counts, 
-                                x='Count', y='Appearance', orientation='h',
-                                title='Nombre d\'armes semi-auto')
-        st.plotly_chart(fig_semi_auto)
+        semi_auto_counts = rga_count(counts, 'armeSemiAutoApparenceArmeAuto', consistent_only=True).reset_index()
+        semi_auto_counts.columns = ['Appearance', 'Count']
+        chart = ChartArtifact('semi_auto', semi_auto_counts)
+        if chart.missing:
+            fig_semi_auto = px.bar(semi_auto_counts,
+                                    x='Count', y='Appearance', orientation='h',
+                                    title='Nombre d\'armes semi-auto')
+            chart.save(fig_semi_auto)
+        chart.show()
 
         
     with tabs[5]:
         st.header("Rankings")
 
     #VISU 18
-        country_counts = df['paysFabricant'].value_counts().head(20).reset_index()
+        country_counts = rga_count(counts, 'paysFabricant', consistent_only=True).head(20).reset_index()
         country_counts.columns = ['paysFabricant', 'Nombre d\'armes']
 
-        fig_country_rank = px.bar(
-            country_counts,
-            x='paysFabricant',
-            y='Nombre d\'armes',
-            title='Classement des 20 premiers pays fabricants d\'armes',
-            labels={'paysFabricant': 'Pays', 'Nombre d\'armes': 'Nombre d\'armes'},
-            color='Nombre d\'armes',
-            color_continuous_scale='Blues',  
-        )
-
-        fig_country_rank.update_yaxes(type="log")
-
-        fig_country_rank.update_layout(
-            height=600,  
-            width=1000,  
-            xaxis_tickangle=-45  
-        )
-
-        st.plotly_chart(fig_country_rank)
+        chart = ChartArtifact('country_rank', country_counts)
+        if chart.missing:
+            fig_country_rank = px.bar(
+                country_counts,
+                x='paysFabricant',
+                y='Nombre d\'armes',
+                title='Classement des 20 premiers pays fabricants d\'armes',
+                labels={'paysFabricant': 'Pays', 'Nombre d\'armes': 'Nombre d\'armes'},
+                color='Nombre d\'armes',
+                color_continuous_scale='Blues',
+            )
+
+            fig_country_rank.update_yaxes(type="log")
+
+            fig_country_rank.update_layout(
+                height=600,
+                width=1000,
+                xaxis_tickangle=-45
+            )
+            chart.save(fig_country_rank)
+        chart.show()
 
 
     #VISU 19
-        manufacturer_counts = df['fabricant'].value_counts().reset_index()
+        manufacturer_counts = rga_count(counts, 'fabricant', consistent_only=True).reset_index()
         manufacturer_counts.columns = ['fabricant', 'Nombre d\'armes']
 
-        fig_manufacturer_rank = px.bar(
-            manufacturer_counts,
-            x='fabricant',
-            y='Nombre d\'armes',
-            title='Classement des fabricants d\'armes',
-            labels={'fabricant': 'Fabricant', 'Nombre d\'armes': 'Nombre d\'armes'},
-            color='Nombre d\'armes',
-            color_continuous_scale='Reds',  
+        chart = ChartArtifact('manufacturer_rank', manufacturer_counts)
+        if chart.missing:
+            fig_manufacturer_rank = px.bar(
+                manufacturer_counts,
+                x='fabricant',
+                y='Nombre d\'armes',
+                title='Classement des fabricants d\'armes',
+                labels={'fabricant': 'Fabricant', 'Nombre d\'armes': 'Nombre d\'armes'},
+                color='Nombre d\'armes',
+                color_continuous_scale='Reds',
+            )
+
+            fig_manufacturer_rank.update_yaxes(type="log")
+
+            fig_manufacturer_rank.update_layout(
+            height=600,
+            width=1000
         )
-
-        fig_manufacturer_rank.update_yaxes(type="log")
-
-        fig_manufacturer_rank.update_layout(
-        height=600,  
-        width=1000   
-    )
-
-        st.plotly_chart(fig_manufacturer_rank)
+            chart.save(fig_manufacturer_rank)
+        chart.show()
 
 
     with tabs[6]:
@@ -1171,36 +1469,85 @@ elif selected == "RGA Analysis":
 
     #VISU 20
         st.subheader("Word Cloud of Weapon Models")
-        wordcloud = WordCloud(width=800, height=400, background_color='white').generate(' '.join(df['modele'].dropna()))
-        plt.figure(figsize=(10, 5))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        st.pyplot(plt)
+        # Word frequencies are precomputed per version, overall and by category, so
+        # only the cloud of a new selection is ever drawn
+        col1, col2 = st.columns(2)
+        cloud_filter = col1.selectbox("Models of:", ['All firearms'] + WORD_CLOUD_FILTERS)
+        cloud_column, cloud_value = None, None
+        if cloud_filter in WORD_CLOUD_FILTERS:
+            cloud_column = cloud_filter
+            cloud_value = col2.selectbox(f"{cloud_filter}:", list(rga_count(counts, cloud_filter, consistent_only=True).index))
+        frequencies = model_word_frequencies(dataset, cloud_column, cloud_value, consistent_only=True)
+
+        if not frequencies:
+            st.write("No model names for this selection.")
+        else:
+            chart = ChartArtifact('model_wordcloud', dataset, consistent=True, column=cloud_column, value=cloud_value, size=WORD_CLOUD_SIZE)
+            if chart.missing:
+                width, height = WORD_CLOUD_SIZE
+                wordcloud = WordCloud(width=width, height=height, background_color='white').generate_from_frequencies(frequencies)
+                plt.figure(figsize=(10, 5))
+                plt.imshow(wordcloud, interpolation='bilinear')
+                plt.axis('off')
+                chart.save(plt)
+            chart.show()
 
     #VISU 21
         st.subheader("Top 10 Manufacturers by Number of Weapons Produced")
-        top_manufacturers = df['fabricant'].value_counts().nlargest(10).reset_index()
+        top_manufacturers = rga_count(counts, 'fabricant', consistent_only=True).head(10).reset_index()
         top_manufacturers.columns = ['Manufacturer', 'Number of Weapons']
-
-        fig_top_manufacturers = px.bar(
-            top_manufacturers,
-            x='Manufacturer',
-            y='Number of Weapons',
-            title='Top 10 Manufacturers by Number of Weapons Produced',
-            labels={'Manufacturer': 'Manufacturer', 'Number of Weapons': 'Number of Weapons'},
-            color='Number of Weapons',
-            color_continuous_scale='Blues'
-        )
-        st.plotly_chart(fig_top_manufacturers)
+        chart = ChartArtifact('top_manufacturers_bar', top_manufacturers)
+        if chart.missing:
+            fig_top_manufacturers = px.bar(
+                top_manufacturers,
+                x='Manufacturer',
+                y='Number of Weapons',
+                title='Top 10 Manufacturers by Number of Weapons Produced',
+                labels={'Manufacturer': 'Manufacturer', 'Number of Weapons': 'Number of Weapons'},
+                color='Number of Weapons',
+                color_continuous_scale='Blues'
+            )
+            chart.save(fig_top_manufacturers)
+        chart.show()
 
     #VISU 22
 
         st.subheader("Types of Weapons and Functioning Mode Heatmap")
-        heatmap_data = pd.crosstab(df['typeArme'], df['modeFonctionnement'])
-        plt.figure(figsize=(13, 7))
-        sns.heatmap(heatmap_data, annot=True, cmap='YlGnBu', fmt='g')
-        plt.title('Heatmap of Types of Weapons and Functioning Mode')
-        st.pyplot(plt)
+        heatmap_data = rga_crosstab(counts, 'typeArme', 'modeFonctionnement', consistent_only=True)
+        chart = ChartArtifact('type_mode_heatmap', heatmap_data)
+        if chart.missing:
+            plt.figure(figsize=(13, 7))
+            sns.heatmap(heatmap_data, annot=True, cmap='YlGnBu', fmt='g')
+            plt.title('Heatmap of Types of Weapons and Functioning Mode')
+            chart.save(plt)
+        chart.show()
+
+    #VISU 23
+        st.subheader("Dimension Explorer")
+        st.write("""
+        This heatmap crosses any two categorical characteristics of the dataset. 
+        The table is read from counts precomputed for every pair of columns, so changing the dimensions does not rescan the data.
+        """)
+
+        col1, col2 = st.columns(2)
+        explorer_row = col1.selectbox("Rows:", RGA_CATEGORY_COLUMNS, index=RGA_CATEGORY_COLUMNS.index('typeArme'))
+        explorer_column = col2.selectbox("Columns:", RGA_CATEGORY_COLUMNS, index=RGA_CATEGORY_COLUMNS.index('paysFabricant'))
+        explorer_size = st.slider("Categories per axis:", 5, 50, 20)
+
+        if explorer_row == explorer_column:
+            st.write("Select two different dimensions.")
+        else:
+            # Keep the most frequent categories of each dimension
+            crosstab = rga_crosstab(counts, explorer_row, explorer_column, consistent_only=True)
+            crosstab = crosstab.loc[crosstab.sum(axis=1).nlargest(explorer_size).index,
+                                    crosstab.sum(axis=0).nlargest(explorer_size).index]
+            chart = ChartArtifact('dimension_explorer', crosstab)
+            if chart.missing:
+                fig_explorer = px.imshow(crosstab, text_auto=True, aspect='auto', color_continuous_scale='YlGnBu',
+                                         labels=dict(x=explorer_column, y=explorer_row, color='Nombre d\'armes'),
+                                         title=f'{explorer_row} vs {explorer_column}')
+                chart.save(fig_explorer)
+            chart.show()
 
 
 
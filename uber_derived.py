@@ -0,0 +1,397 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from density import kde_curve
+from derived_registry import derived_value, freeze, registry
+from uber_geo import (grid_centers, grid_counts, grid_index, hex_counts, index_bbox, index_radius, od_counts, top_k,
+                     trip_distances)
+from uber_store import HOUR_NS, load_uber_version
+
+
+# Most pickups a viewport query returns; denser views are thinned evenly
+VIEW_POINT_LIMIT = 20_000
+
+# Seed of the synthetic dropoff times, so every rerun and session draws the
+# same durations
+DURATION_SEED = 42
+DURATION_BINS = 30
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Hexagon radii in metres of the Zones clusters pyramid
+HEX_RADII = [50, 100, 250, 500, 1000, 2000]
+
+# Seed and sizes of the map samples
+SAMPLE_SEED = 42
+SAMPLE_SIZES = [50, 100, 150, 250, 500, 1000, 2500, 5000]
+
+# Hours of the day of a view that keeps them all
+ALL_HOURS = (0, 23)
+
+# Sample orders by stratum: uniform, or spread over the hours or the Bases in
+# proportion to their trips
+SAMPLE_STRATA = {'Uniform': None, 'By hour': 'hour', 'By Base': 'base'}
+
+
+# Derived columns and scalars of the Uber frame, by name, computed from the
+# base frame and other entries
+_derived = registry('uber')
+
+# Entries that can also be computed over the rows of a time view; they take
+# the positions of the rows to use
+VIEWED = {}
+
+
+def derived(name, viewed=False):
+    def register(compute):
+        if viewed:
+            VIEWED[name] = compute
+            _derived(name)(lambda version: compute(version, slice(None)))
+        else:
+            _derived(name)(compute)
+        return compute
+    return register
+
+
+def uber_derived(version, name):
+    return derived_value('uber', version, name)
+
+
+@st.cache_resource(max_entries=32)
+def _view_entry(version, view, name):
+    return freeze(VIEWED[name](version, view_positions(version, view)))
+
+
+# An entry over the rows of a time view; the whole version when view is None
+def uber_derived_in_view(version, view, name):
+    if view is None:
+        return uber_derived(version, name)
+    return _view_entry(version, view, name)
+
+
+# Each pickup paired with the next one as its dropoff. Every column is a view
+# over the base arrays, so no row is copied and the last pickup is left out.
+@derived('trips')
+def _trips(version):
+    frame = load_uber_version(version)
+    lat, lon = frame['Lat'].to_numpy(), frame['Lon'].to_numpy()
+    return pd.DataFrame({
+        'Date/Time': frame['Date/Time'].to_numpy()[:-1],
+        'Lat': lat[:-1],
+        'Lon': lon[:-1],
+        'Base': frame['Base'].array[:-1],
+        'next_lat': lat[1:],
+        'next_lon': lon[1:],
+    }, copy=False)
+
+
+@derived('lat_mean')
+def _lat_mean(version):
+    return float(load_uber_version(version)['Lat'].mean())
+
+
+@derived('lon_mean')
+def _lon_mean(version):
+    return float(load_uber_version(version)['Lon'].mean())
+
+
+@derived('hour')
+def _hour(version):
+    timestamps = load_uber_version(version)['Date/Time'].to_numpy().view('int64')
+    return ((timestamps // HOUR_NS) % 24).astype('int8')
+
+
+# Pickup positions grouped by hour of the day, in time order within each
+# hour, so an hour range is a few slices instead of a mask over every row
+@derived('hour_positions')
+def _hour_positions(version):
+    hours = uber_derived(version, 'hour')
+    order = np.argsort(hours, kind='stable')
+    return {'order': freeze(order), 'starts': np.searchsorted(hours[order], np.arange(25))}
+
+
+# The rows of a dataset version between two days and within a range of hours
+# of the day: the position range found by binary search over the sorted pickup
+# times, with the hours. None stands for every row, so callers keep using
+# their whole-version caches.
+def time_view(version, days=None, hours=ALL_HOURS):
+    timestamps = load_uber_version(version)['Date/Time'].to_numpy().view('int64')
+    first, last = 0, len(timestamps)
+    if days is not None:
+        bounds = np.array([np.datetime64(days[0], 'D'), np.datetime64(days[1], 'D') + 1], dtype='datetime64[ns]')
+        first, last = (int(position) for position in np.searchsorted(timestamps, bounds.view('int64')))
+    if (first, last) == (0, len(timestamps)) and tuple(hours) == ALL_HOURS:
+        return None
+    return first, last, tuple(hours)
+
+
+# Positions of the rows of a view in the base frame: a zero-copy slice when
+# only the time range narrows it, else the hour slices cut to the time range
+def view_positions(version, view):
+    if view is None:
+        return slice(None)
+    first, last, (low, high) = view
+    if (low, high) == ALL_HOURS:
+        return slice(first, last)
+    hour_positions = uber_derived(version, 'hour_positions')
+    pieces = []
+    for hour in range(low, high + 1):
+        positions = hour_positions['order'][hour_positions['starts'][hour]:hour_positions['starts'][hour + 1]]
+        pieces.append(positions[np.searchsorted(positions, first):np.searchsorted(positions, last)])
+    return np.sort(np.concatenate(pieces))
+
+
+# Positions cut to the trips, which leave out the last pickup
+def _trip_positions(version, positions):
+    trips = len(uber_derived(version, 'trips'))
+    if isinstance(positions, slice):
+        return slice(*positions.indices(trips)[:2])
+    return positions[positions < trips]
+
+
+# Positions in the base frame of the picks made among the rows at positions
+def _at(positions, picks):
+    return positions.start + picks if isinstance(positions, slice) else positions[picks]
+
+
+# The given positions that fall inside a view
+def _keep_in_view(version, positions, view):
+    if view is None:
+        return positions
+    first, last, (low, high) = view
+    hours = uber_derived(version, 'hour')[positions]
+    return positions[(positions >= first) & (positions < last) & (hours >= low) & (hours <= high)]
+
+
+# Pickups counted by hour, weekday, day of the month and Base in one pass,
+# so any slice of the Time page reads a few thousand cells instead of rows
+@derived('time_cube', viewed=True)
+def _time_cube(version, positions):
+    frame = load_uber_version(version)
+    timestamps = frame['Date/Time'].to_numpy()[positions]
+    days = timestamps.astype('datetime64[D]')
+    weekday = (days.view('int64') + 3) % 7  # 1970-01-01 was a Thursday
+    day = (days - days.astype('datetime64[M]')).view('int64')
+    bases = frame['Base'].cat.codes.to_numpy()[positions].astype('int64')
+    shape = (24, 7, 31, len(frame['Base'].cat.categories))
+    valid = bases >= 0
+    hours = uber_derived(version, 'hour')[positions]
+    cells = np.ravel_multi_index((hours[valid], weekday[valid], day[valid], bases[valid]), shape)
+    return np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+
+
+# Pickups per hour over the selected weekdays (0 is Monday), first and last
+# day of the month and Bases, read from the count cube of a time view
+def hourly_counts(version, weekdays=range(7), days=(1, 31), bases=None, view=None):
+    cube = uber_derived_in_view(version, view, 'time_cube')
+    categories = list(load_uber_version(version)['Base'].cat.categories)
+    bases = categories if bases is None else bases
+    selection = np.ix_(range(24), list(weekdays), range(days[0] - 1, days[1]),
+                       [categories.index(base) for base in bases])
+    return pd.Series(cube[selection].sum(axis=(1, 2, 3)), index=pd.RangeIndex(24, name='hour'), name='count')
+
+
+# Haversine metres of every trip
+@derived('distance')
+def _distance(version):
+    lat, lon = (load_uber_version(version)[column].to_numpy() for column in ('Lat', 'Lon'))
+    return trip_distances(lat, lon)
+
+
+# Synthetic dropoff 5 to 59 minutes after each pickup, drawn once per version
+# from a seeded generator
+@derived('Dropoff Time')
+def _dropoff_time(version):
+    pickups = load_uber_version(version)['Date/Time'].to_numpy()
+    minutes = np.random.default_rng(DURATION_SEED).integers(5, 60, len(pickups))
+    return pickups + minutes.astype('timedelta64[m]')
+
+
+@derived('Trip Duration')
+def _trip_duration(version):
+    pickups = load_uber_version(version)['Date/Time'].to_numpy()
+    return (uber_derived(version, 'Dropoff Time') - pickups) / np.timedelta64(1, 'm')
+
+
+# Trip positions in a seeded random order, so any sample of n trips is the
+# first n positions and maps gather rows instead of shuffling the frame
+@derived('sample_order')
+def _sample_order(version):
+    trips = len(uber_derived(version, 'trips'))
+    return np.random.default_rng(SAMPLE_SEED).permutation(trips)
+
+
+# The random order rearranged so that every prefix takes each stratum in
+# proportion to its size: the i-th drawn trip of a stratum of m trips comes at
+# (i + 0.5) / m
+def _stratified_order(order, strata):
+    drawn = strata[order]
+    sizes = np.bincount(drawn)
+    grouped = np.argsort(drawn, kind='stable')
+    ranks = np.empty(len(order))
+    ranks[grouped] = np.arange(len(order)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return order[np.argsort((ranks + 0.5) / sizes[drawn], kind='stable')]
+
+
+@derived('sample_order_hour')
+def _sample_order_hour(version):
+    order = uber_derived(version, 'sample_order')
+    return _stratified_order(order, uber_derived(version, 'hour')[:-1])
+
+
+@derived('sample_order_base')
+def _sample_order_base(version):
+    order = uber_derived(version, 'sample_order')
+    codes = load_uber_version(version)['Base'].cat.codes.to_numpy()[:-1]
+    return _stratified_order(order, codes.astype('int64') + 1)
+
+
+# Trip positions of a deterministic sample of n trips of a time view, drawn by
+# one of SAMPLE_STRATA. The order is read in growing chunks until n of its
+# trips fall inside the view.
+def sample_positions(version, n, strata='Uniform', view=None):
+    name = 'sample_order' if SAMPLE_STRATA[strata] is None else f"sample_order_{SAMPLE_STRATA[strata]}"
+    order = uber_derived(version, name)
+    if view is None:
+        return order[:n]
+    picked, start, chunk = [], 0, max(n, 1)
+    while start < len(order) and sum(map(len, picked)) < n:
+        picked.append(_keep_in_view(version, order[start:start + chunk], view))
+        start, chunk = start + chunk, chunk * 2
+    return np.concatenate(picked)[:n] if picked else order[:0]
+
+
+# Hexagonal bin counts of every pickup and dropoff at each radius of
+# HEX_RADII, so a map only receives the pre-aggregated level it shows
+@derived('hexagons', viewed=True)
+def _hexagons(version, positions):
+    trips = uber_derived(version, 'trips')
+    positions = _trip_positions(version, positions)
+    lat = np.concatenate([trips['Lat'].to_numpy()[positions], trips['next_lat'].to_numpy()[positions]])
+    lon = np.concatenate([trips['Lon'].to_numpy()[positions], trips['next_lon'].to_numpy()[positions]])
+    origin = uber_derived(version, 'lat_mean'), uber_derived(version, 'lon_mean')
+    pyramid = {}
+    for radius in HEX_RADII:
+        cell_lat, cell_lon, counts = hex_counts(lat, lon, radius, origin)
+        pyramid[radius] = pd.DataFrame({'Lat': cell_lat, 'Lon': cell_lon, 'count': counts})
+    return pyramid
+
+
+# Grid index over the pickups of the base frame, answering radius and
+# bounding-box queries without scanning every row
+@derived('pickup_index')
+def _pickup_index(version):
+    frame = load_uber_version(version)
+    return grid_index(frame['Lat'].to_numpy(), frame['Lon'].to_numpy())
+
+
+def _pickups(version):
+    frame = load_uber_version(version)
+    return uber_derived(version, 'pickup_index'), frame['Lat'].to_numpy(), frame['Lon'].to_numpy()
+
+
+# Positions in the base frame of the pickups of a time view within radius
+# metres of a point
+def pickups_within(version, lat, lon, radius, view=None):
+    index, pickup_lat, pickup_lon = _pickups(version)
+    return _keep_in_view(version, index_radius(index, pickup_lat, pickup_lon, lat, lon, radius), view)
+
+
+# Positions in the base frame of the pickups of a time view inside a
+# viewport, at most VIEW_POINT_LIMIT of them
+def pickups_in_view(version, south, west, north, east, view=None):
+    index, pickup_lat, pickup_lon = _pickups(version)
+    positions = _keep_in_view(version, index_bbox(index, pickup_lat, pickup_lon, south, west, north, east), view)
+    step = max(1, -(-len(positions) // VIEW_POINT_LIMIT))
+    return positions[::step]
+
+
+# Histogram and density curve of the trip durations, so the chart is drawn
+# from a few hundred points instead of every trip. A view without trips has
+# empty arrays and no mean.
+@derived('duration_histogram', viewed=True)
+def _duration_histogram(version, positions):
+    durations = uber_derived(version, 'Trip Duration')[positions]
+    if not len(durations):
+        return {'counts': np.empty(0, dtype='int64'), 'edges': np.empty(0), 'grid': np.empty(0),
+                'density': np.empty(0), 'mean': float('nan'), 'total': 0}
+    counts, edges = np.histogram(durations, bins=DURATION_BINS)
+    # Over the range of the data only, like histplot(kde=True)
+    grid, density = kde_curve(durations, cut=0)
+    return {'counts': counts, 'edges': edges, 'grid': grid, 'density': density,
+            'mean': float(durations.mean()), 'total': len(durations)}
+
+
+def _trips_at(trips, distances, positions):
+    return pd.DataFrame({
+        'start_lat': trips['Lat'].to_numpy()[positions],
+        'start_lon': trips['Lon'].to_numpy()[positions],
+        'end_lat': trips['next_lat'].to_numpy()[positions],
+        'end_lon': trips['next_lon'].to_numpy()[positions],
+        'distance': distances[positions],
+    })
+
+
+# The k longest and the k shortest non-zero trips of a time view
+@st.cache_resource(max_entries=32)
+def trip_extremes(version, k, view=None):
+    trips, distances = uber_derived(version, 'trips'), uber_derived(version, 'distance')
+    positions = _trip_positions(version, view_positions(version, view))
+    in_view = distances[positions]
+    positive = np.flatnonzero(in_view > 0)
+    longest = _at(positions, top_k(in_view, k))
+    shortest = _at(positions, positive[top_k(in_view[positive], k, largest=False)])
+    return _trips_at(trips, distances, longest), _trips_at(trips, distances, shortest)
+
+
+@st.cache_resource(max_entries=32)
+def _cell_counts(version, resolution, columns, view=None):
+    trips = uber_derived(version, 'trips')
+    positions = _trip_positions(version, view_positions(version, view))
+    lat, lon = (trips[column].to_numpy()[positions] for column in columns)
+    keys, counts = grid_counts(lat, lon, resolution)
+    return freeze(keys), freeze(counts)
+
+
+# Pickups of a time view binned into weighted grid cells, so the maps receive
+# one row per occupied cell instead of one row per trip
+def grid_cells(version, resolution, view=None):
+    keys, counts = _cell_counts(version, resolution, ('Lat', 'Lon'), view)
+    cell_lat, cell_lon = grid_centers(keys, resolution)
+    return pd.DataFrame({'Lat': cell_lat, 'Lon': cell_lon, 'count': counts})
+
+
+# The n busiest pickup and dropoff cells of a time view at a resolution,
+# ranked by partial selection over the cached cell counts, in the shape of the
+# SQL backend's location counts
+def hotspots(version, resolution, n=40, view=None):
+    tops = []
+    for columns in (('Lat', 'Lon'), ('next_lat', 'next_lon')):
+        keys, counts = _cell_counts(version, resolution, columns, view)
+        top = top_k(counts, n)
+        cell_lat, cell_lon = grid_centers(keys[top], resolution)
+        tops.append(pd.DataFrame({columns[0]: cell_lat, columns[1]: cell_lon, 'Frequency': counts[top]}))
+    return tuple(tops)
+
+
+@st.cache_resource(max_entries=16)
+def _flow_counts(version, resolution, view=None):
+    trips = uber_derived(version, 'trips')
+    positions = _trip_positions(version, view_positions(version, view))
+    origins, destinations, counts = od_counts(*(trips[column].to_numpy()[positions]
+                                                for column in ('Lat', 'Lon', 'next_lat', 'next_lon')), resolution)
+    # Trips that stay in their cell draw no arc
+    moving = origins != destinations
+    return freeze(origins[moving]), freeze(destinations[moving]), freeze(counts[moving])
+
+
+# The n largest flows of a time view between grid cells at a resolution, from
+# the origin-destination counts of every trip, as arcs between cell centres
+def top_flows(version, resolution, n=200, view=None):
+    origins, destinations, counts = _flow_counts(version, resolution, view)
+    top = top_k(counts, n)
+    start_lat, start_lon = grid_centers(origins[top], resolution)
+    end_lat, end_lon = grid_centers(destinations[top], resolution)
+    return pd.DataFrame({'start_lat': start_lat, 'start_lon': start_lon,
+                         'end_lat': end_lat, 'end_lon': end_lon, 'count': counts[top]})
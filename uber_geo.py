@@ -0,0 +1,147 @@
+import numpy as np
+
+
+# Default grid resolution in degrees (about 100 m in New York City)
+GRID_RESOLUTION = 0.001
+EARTH_RADIUS_M = 6_371_008.8
+METRES_PER_DEGREE = np.pi * EARTH_RADIUS_M / 180
+# Web Mercator metres per pixel at zoom 0 on the equator
+METRES_PER_PIXEL_Z0 = 156_543.03
+# Shift applied to hexagon coordinates so that they pack into one integer key
+HEX_OFFSET = 2**20
+
+
+def grid_width(resolution):
+    return int(np.ceil(360.0 / resolution)) + 1
+
+
+# Integer key of the grid cell holding each point, so that counting cells is a
+# plain integer count instead of grouping float pairs
+def grid_keys(lat, lon, resolution=GRID_RESOLUTION):
+    rows = np.floor((np.asarray(lat, dtype='float64') + 90.0) / resolution).astype('int64')
+    cols = np.floor((np.asarray(lon, dtype='float64') + 180.0) / resolution).astype('int64')
+    return rows * grid_width(resolution) + cols
+
+
+# Latitude and longitude of the centre of each grid cell
+def grid_centers(keys, resolution=GRID_RESOLUTION):
+    rows, cols = np.divmod(np.asarray(keys, dtype='int64'), grid_width(resolution))
+    return (rows + 0.5) * resolution - 90.0, (cols + 0.5) * resolution - 180.0
+
+
+# Occupied grid cells and the number of points in each
+def grid_counts(lat, lon, resolution=GRID_RESOLUTION):
+    return np.unique(grid_keys(lat, lon, resolution), return_counts=True)
+
+
+# Origin-destination flows between grid cells: every distinct pair of origin
+# and destination cells with its number of trips, which is the sparse form of
+# the OD count matrix. Occupied cells are numbered densely first, so that each
+# pair packs into one integer and counting pairs is a plain integer count.
+def od_counts(origin_lat, origin_lon, destination_lat, destination_lon, resolution=GRID_RESOLUTION):
+    origins = grid_keys(origin_lat, origin_lon, resolution)
+    destinations = grid_keys(destination_lat, destination_lon, resolution)
+    cells, codes = np.unique(np.concatenate([origins, destinations]), return_inverse=True)
+    pairs, counts = np.unique(codes[:len(origins)] * len(cells) + codes[len(origins):], return_counts=True)
+    origin_codes, destination_codes = np.divmod(pairs, len(cells))
+    return cells[origin_codes], cells[destination_codes], counts
+
+
+# Positions of the points sorted by grid cell, with the start of every
+# occupied cell, so that the points of any cell are one contiguous slice
+def grid_index(lat, lon, resolution=GRID_RESOLUTION):
+    keys = grid_keys(lat, lon, resolution)
+    order = np.argsort(keys, kind='stable')
+    cells, starts = np.unique(keys[order], return_index=True)
+    return {'resolution': resolution, 'order': order, 'cells': cells, 'starts': np.append(starts, len(order))}
+
+
+# Positions of the points inside a bounding box. Cells of one grid row are
+# consecutive keys, so each row of the box is a single range of the index.
+def index_bbox(index, lat, lon, south, west, north, east):
+    resolution, cells, starts = index['resolution'], index['cells'], index['starts']
+    rows = np.arange(np.floor((south + 90.0) / resolution), np.floor((north + 90.0) / resolution) + 1, dtype='int64')
+    row_keys = rows * grid_width(resolution)
+    first = np.searchsorted(cells, row_keys + int(np.floor((west + 180.0) / resolution)), 'left')
+    last = np.searchsorted(cells, row_keys + int(np.floor((east + 180.0) / resolution)), 'right')
+    pieces = [index['order'][starts[a]:starts[b]] for a, b in zip(first, last) if b > a]
+    if not pieces:
+        return np.empty(0, dtype='int64')
+    candidates = np.sort(np.concatenate(pieces))
+    inside = ((lat[candidates] >= south) & (lat[candidates] <= north)
+              & (lon[candidates] >= west) & (lon[candidates] <= east))
+    return candidates[inside]
+
+
+# Positions of the points within radius metres of (centre_lat, centre_lon),
+# looking only at the cells around the circle
+def index_radius(index, lat, lon, centre_lat, centre_lon, radius):
+    dlat = radius / METRES_PER_DEGREE
+    dlon = radius / (METRES_PER_DEGREE * max(np.cos(np.radians(centre_lat)), 1e-6))
+    candidates = index_bbox(index, lat, lon, centre_lat - dlat, centre_lon - dlon, centre_lat + dlat, centre_lon + dlon)
+    distances = haversine_metres(centre_lat, centre_lon, lat[candidates], lon[candidates])
+    return candidates[distances <= radius]
+
+
+# Map zoom at which a circle of the given radius fills part of the view
+def zoom_for_radius(centre_lat, radius, height=500, share=0.35):
+    return float(np.log2(METRES_PER_PIXEL_Z0 * np.cos(np.radians(centre_lat)) * height * share / radius))
+
+
+# Bounding box (south, west, north, east) seen by a map of the given size in
+# pixels centred on (centre_lat, centre_lon) at a Web Mercator zoom
+def viewport_bounds(centre_lat, centre_lon, zoom, width=700, height=500):
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    half_lon = width / 2 * degrees_per_pixel
+    half_lat = height / 2 * degrees_per_pixel * np.cos(np.radians(centre_lat))
+    return centre_lat - half_lat, centre_lon - half_lon, centre_lat + half_lat, centre_lon + half_lon
+
+
+# Flat-topped hexagonal bins of the given circumradius in metres, laid out on
+# a local projection around origin (lat, lon). Returns the centre of every
+# occupied hexagon and its number of points.
+def hex_counts(lat, lon, radius, origin):
+    origin_lat, origin_lon = origin
+    lon_scale = METRES_PER_DEGREE * np.cos(np.radians(origin_lat))
+    x = (np.asarray(lon, dtype='float64') - origin_lon) * lon_scale
+    y = (np.asarray(lat, dtype='float64') - origin_lat) * METRES_PER_DEGREE
+    q = x * (2 / 3) / radius
+    r = (y * np.sqrt(3) / 3 - x / 3) / radius
+    # Round the cube coordinates (q, r, -q - r) to the nearest hexagon
+    s = -q - r
+    round_q, round_r, round_s = np.round(q), np.round(r), np.round(s)
+    error_q, error_r, error_s = np.abs(round_q - q), np.abs(round_r - r), np.abs(round_s - s)
+    fix_q = (error_q > error_r) & (error_q > error_s)
+    fix_r = ~fix_q & (error_r > error_s)
+    round_q = np.where(fix_q, -round_r - round_s, round_q).astype('int64')
+    round_r = np.where(fix_r, -round_q - round_s, round_r).astype('int64')
+    keys, counts = np.unique((round_q + HEX_OFFSET) * (2 * HEX_OFFSET) + round_r + HEX_OFFSET, return_counts=True)
+    q, r = np.divmod(keys, 2 * HEX_OFFSET)
+    q, r = q - HEX_OFFSET, r - HEX_OFFSET
+    return (origin_lat + radius * np.sqrt(3) * (r + q / 2) / METRES_PER_DEGREE,
+            origin_lon + radius * 1.5 * q / lon_scale,
+            counts)
+
+
+# Great-circle distance in metres, computed in float32
+def haversine_metres(lat, lon, next_lat, next_lon):
+    lat, lon, next_lat, next_lon = (np.radians(np.asarray(values, dtype='float32'))
+                                    for values in (lat, lon, next_lat, next_lon))
+    a = np.sin((next_lat - lat) / 2) ** 2 + np.cos(lat) * np.cos(next_lat) * np.sin((next_lon - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+# Distance of every trip, a trip being a pickup followed by the next pickup
+def trip_distances(lat, lon):
+    return haversine_metres(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+
+# Positions of the k largest (or smallest) values, ordered, using a partial
+# selection instead of a full sort
+def top_k(values, k, largest=True):
+    k = min(k, len(values))
+    if k <= 0:
+        return np.empty(0, dtype='int64')
+    keys = -values if largest else values
+    selected = np.argpartition(keys, k - 1)[:k]
+    return selected[np.argsort(keys[selected], kind='stable')]
@@ -0,0 +1,197 @@
+import datetime
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_cache import DAY_NS, cache_path, file_fingerprint, write_atomic
+
+
+UBER_SOURCES = 'uber-raw-data-*.csv'
+UBER_DATE_FORMAT = '%m/%d/%Y %H:%M:%S'
+HOUR_NS = 3_600 * 10**9
+
+
+UBER_DTYPES = {'Date/Time': str, 'Lat': 'float32', 'Lon': 'float32', 'Base': 'category'}
+
+
+# Convert raw CSV rows into compact types: float32 coordinates, categorical
+# base and int64 epoch nanoseconds for the pickup time
+def typed_uber_frame(raw):
+    timestamps = pd.to_datetime(raw['Date/Time'], format=UBER_DATE_FORMAT, errors='coerce')
+    if timestamps.isna().all() and len(raw):
+        timestamps = pd.to_datetime(raw['Date/Time'], errors='coerce')
+    valid = timestamps.notna().to_numpy()
+    return pd.DataFrame({
+        'Date/Time': timestamps.to_numpy(dtype='datetime64[ns]')[valid].view('int64'),
+        'Lat': raw['Lat'].to_numpy()[valid],
+        'Lon': raw['Lon'].to_numpy()[valid],
+        'Base': raw['Base'][valid].reset_index(drop=True),
+    })
+
+
+# Parse the raw CSV once
+def parse_uber_csv(source):
+    return typed_uber_frame(pd.read_csv(source, dtype=UBER_DTYPES))
+
+
+# Columnar cache as stored on disk, converted from the CSV on first use
+def read_columnar(path, fingerprint):
+    target = cache_path(path, fingerprint, '.parquet')
+    if not os.path.exists(target):
+        write_atomic(parse_uber_csv(path), target)
+    return pd.read_parquet(target)
+
+
+# Fixed-width arrays of the coordinate store. Each process maps these files
+# read-only, so all server processes share one copy through the page cache.
+COORDINATE_ARRAYS = {'timestamp': 'int64', 'Lat': 'float32', 'Lon': 'float32', 'base_code': 'int16'}
+
+# Renamed whenever the store layout changes, so stores written by an earlier
+# layout are rebuilt rather than misread
+COORDINATE_STORE_SUFFIX = '.sorted.mmap'
+
+
+# One store per source month, with rows sorted by pickup time so that every day
+# is a contiguous partition listed in index.json and any time range is found
+# by binary search
+def write_coordinate_store(frame, target):
+    temporary = f"{target}.{os.getpid()}.tmp"
+    os.makedirs(temporary, exist_ok=True)
+    order = np.argsort(frame['Date/Time'].to_numpy(), kind='stable')
+    days = frame['Date/Time'].to_numpy() // DAY_NS
+    arrays = {
+        'timestamp': frame['Date/Time'].to_numpy(),
+        'Lat': frame['Lat'].to_numpy(),
+        'Lon': frame['Lon'].to_numpy(),
+        'base_code': frame['Base'].cat.codes.to_numpy(),
+    }
+    for name, dtype in COORDINATE_ARRAYS.items():
+        np.save(os.path.join(temporary, f"{name}.npy"), arrays[name][order].astype(dtype, copy=False))
+    day_numbers, starts = np.unique(days[order], return_index=True)
+    stops = np.append(starts[1:], len(order))
+    index = {
+        'bases': [str(base) for base in frame['Base'].cat.categories],
+        'days': [[str(np.datetime64(int(day), 'D')), int(first), int(last)]
+                 for day, first, last in zip(day_numbers, starts, stops)],
+    }
+    with open(os.path.join(temporary, 'index.json'), 'w') as handle:
+        json.dump(index, handle)
+    try:
+        os.replace(temporary, target)
+    except OSError:
+        # Another process finished the same store first
+        shutil.rmtree(temporary, ignore_errors=True)
+
+
+def open_coordinate_store(path, fingerprint):
+    target = cache_path(path, fingerprint, COORDINATE_STORE_SUFFIX)
+    if not os.path.isdir(target):
+        write_coordinate_store(read_columnar(path, fingerprint), target)
+    arrays = {name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode='r') for name in COORDINATE_ARRAYS}
+    with open(os.path.join(target, 'index.json')) as handle:
+        arrays.update(json.load(handle))
+    return arrays
+
+
+def uber_sources(pattern=UBER_SOURCES):
+    return tuple((path, file_fingerprint(path)) for path in sorted(glob.glob(pattern)))
+
+
+# In chronological order, so the concatenated months stay sorted by time
+@st.cache_resource(show_spinner="Preparing Uber partitions...", max_entries=4)
+def _open_stores(sources):
+    stores = [open_coordinate_store(path, fingerprint) for path, fingerprint in sources]
+    return sorted(stores, key=lambda store: store['days'][0][0] if store['days'] else '')
+
+
+# Parquet caches of the trip files, for engines that scan them directly
+def uber_parquet_files(pattern=UBER_SOURCES):
+    sources = uber_sources(pattern)
+    _open_stores(sources)
+    return [cache_path(path, fingerprint, '.parquet') for path, fingerprint in sources]
+
+
+# Rows of each store whose day partitions overlap [start, end]. Days are
+# contiguous, so every store contributes at most one slice.
+def _prune(stores, start, end):
+    pieces = []
+    for store in stores:
+        selected = [(first, last) for day, first, last in store['days'] if start <= day <= end]
+        if selected:
+            pieces.append((store, selected[0][0], selected[-1][1]))
+    return pieces
+
+
+# Only the selected slices of the memory-mapped stores are ever touched. A
+# range inside one month stays a zero-copy view; a range spanning several
+# months concatenates just the selected rows. Rows come sorted by pickup time.
+@st.cache_resource(show_spinner="Loading Uber data...", max_entries=8)
+def load_uber_version(version):
+    sources, start, end = version
+    pieces = _prune(_open_stores(sources), start, end)
+    bases = sorted(set().union(*(store['bases'] for store, _, _ in pieces)))
+    columns = {name: [] for name in COORDINATE_ARRAYS}
+    for store, first, last in pieces:
+        for name in COORDINATE_ARRAYS:
+            columns[name].append(store[name][first:last])
+        if store['bases'] != bases:
+            codes = columns['base_code'][-1]
+            remap = np.searchsorted(bases, store['bases']).astype('int16')
+            columns['base_code'][-1] = np.where(codes < 0, codes, remap[codes])
+    for name, dtype in COORDINATE_ARRAYS.items():
+        arrays = columns[name]
+        columns[name] = arrays[0] if len(arrays) == 1 else np.concatenate(arrays) if arrays else np.empty(0, dtype)
+    return pd.DataFrame({
+        'Date/Time': columns['timestamp'].view('datetime64[ns]'),
+        'Lat': columns['Lat'],
+        'Lon': columns['Lon'],
+        'Base': pd.Categorical.from_codes(columns['base_code'], bases, validate=False),
+    }, copy=False)
+
+
+# First and last day available, plus the last day of the first month, which
+# is the default selection
+def uber_date_bounds(pattern=UBER_SOURCES):
+    stores = [store for store in _open_stores(uber_sources(pattern)) if store['days']]
+    if not stores:
+        return None
+    days = [day for store in stores for day, _, _ in store['days']]
+    bounds = min(days), max(days), stores[0]['days'][-1][0]
+    return tuple(datetime.date.fromisoformat(day) for day in bounds)
+
+
+# Identifies one loaded dataset: the source files with their fingerprints and
+# the selected date range. Caches of anything derived from the frame key on it.
+def uber_version(start=None, end=None, pattern=UBER_SOURCES):
+    start = '0000-01-01' if start is None else str(start)
+    end = '9999-12-31' if end is None else str(end)
+    return uber_sources(pattern), start, end
+
+
+# Sidebar date range for the Uber pages; a half-picked range counts as one day
+def uber_date_range_input(pattern=UBER_SOURCES):
+    bounds = uber_date_bounds(pattern)
+    if bounds is None:
+        st.error("No Uber trip files were found.")
+        st.stop()
+    first, last, default_end = bounds
+    selection = st.sidebar.date_input("Select a date range:", value=(first, default_end),
+                                      min_value=first, max_value=last)
+    if len(selection) == 1:
+        return selection[0], selection[0]
+    return selection
+
+
+# Sidebar filters narrowing the loaded range to some of its days and hours of
+# the day. They select rows of the loaded data instead of loading another range.
+def uber_time_filter_input(start, end):
+    days = (start, end)
+    if start < end:
+        days = st.sidebar.slider("Days shown:", min_value=start, max_value=end, value=(start, end))
+    hours = st.sidebar.slider("Hours of the day:", 0, 23, (0, 23))
+    return days, hours
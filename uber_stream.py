@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from uber_geo import GRID_RESOLUTION, grid_centers, grid_counts, trip_distances
+from uber_store import HOUR_NS, UBER_DTYPES, UBER_SOURCES, typed_uber_frame, uber_sources
+
+
+STREAM_CHUNK_ROWS = 250_000
+
+
+def _trip(distance, lat, lon, next_lat, next_lon):
+    return {'start_lat': float(lat), 'start_lon': float(lon),
+            'end_lat': float(next_lat), 'end_lon': float(next_lon), 'distance': float(distance)}
+
+
+# Aggregates of the Uber pages computed in one chunked pass. Memory is bounded
+# by the chunk size and the number of occupied grid cells, never by the number
+# of rows. The last pickup of each chunk is carried over so that consecutive
+# pairs spanning two chunks of a file are still measured; no trip spans two
+# files. Pickups are paired in file order, whereas the in-memory mode pairs
+# them in time order across every month, so the two modes can report
+# different longest and shortest trips.
+def stream_uber_aggregates(paths, resolution=GRID_RESOLUTION, chunksize=STREAM_CHUNK_ROWS):
+    hourly = np.zeros(24, dtype='int64')
+    cells = pd.Series(dtype='float64')
+    rows, lat_sum, lon_sum = 0, 0.0, 0.0
+    longest = _trip(-np.inf, np.nan, np.nan, np.nan, np.nan)
+    shortest = _trip(np.inf, np.nan, np.nan, np.nan, np.nan)
+
+    for path in paths:
+        previous = None
+        for raw in pd.read_csv(path, dtype=UBER_DTYPES, chunksize=chunksize):
+            chunk = typed_uber_frame(raw)
+            if chunk.empty:
+                continue
+            lat = chunk['Lat'].to_numpy()
+            lon = chunk['Lon'].to_numpy()
+
+            rows += len(chunk)
+            lat_sum += lat.sum(dtype='float64')
+            lon_sum += lon.sum(dtype='float64')
+            hourly += np.bincount((chunk['Date/Time'].to_numpy() // HOUR_NS) % 24, minlength=24)
+            keys, counts = grid_counts(lat, lon, resolution)
+            cells = cells.add(pd.Series(counts, index=keys), fill_value=0)
+
+            if previous is not None:
+                lat = np.concatenate(([previous[0]], lat))
+                lon = np.concatenate(([previous[1]], lon))
+            previous = lat[-1], lon[-1]
+            if len(lat) < 2:
+                continue
+            distances = trip_distances(lat, lon)
+            i = distances.argmax()
+            if distances[i] > longest['distance']:
+                longest = _trip(distances[i], lat[i], lon[i], lat[i + 1], lon[i + 1])
+            positive = np.flatnonzero(distances > 0)
+            if len(positive):
+                i = positive[distances[positive].argmin()]
+                if distances[i] < shortest['distance']:
+                    shortest = _trip(distances[i], lat[i], lon[i], lat[i + 1], lon[i + 1])
+
+    cell_lat, cell_lon = grid_centers(cells.index.to_numpy(dtype='int64'), resolution)
+    return {
+        'rows': rows,
+        'lat_mean': lat_sum / rows if rows else np.nan,
+        'lon_mean': lon_sum / rows if rows else np.nan,
+        'hourly': pd.Series(hourly, index=pd.RangeIndex(24, name='hour'), name='count'),
+        'cells': pd.DataFrame({'Lat': cell_lat, 'Lon': cell_lon, 'count': cells.to_numpy(dtype='int64')}),
+        'longest': longest,
+        'shortest': shortest,
+    }
+
+
+@st.cache_resource(show_spinner="Streaming Uber trip files...", max_entries=4)
+def _load_aggregates(sources, resolution):
+    return stream_uber_aggregates([path for path, _ in sources], resolution)
+
+
+# Cached per source version, so the files are streamed once per process
+def load_uber_aggregates(pattern=UBER_SOURCES, resolution=GRID_RESOLUTION):
+    return _load_aggregates(uber_sources(pattern), resolution)
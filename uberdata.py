@@ -4,9 +4,15 @@ import pydeck as pdk
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-
-# Load the data
-data = pd.read_csv('uber-raw-data-apr14.csv', parse_dates=['Date/Time'])
+from chart_cache import ChartArtifact
+from deck_layers import CompactDeck, map_layer
+from sql_backend import sql_backend_toggle, uber_hourly_counts, uber_location_counts
+from uber_derived import (HEX_RADII, SAMPLE_SIZES, SAMPLE_STRATA, WEEKDAYS, grid_cells, hotspots, hourly_counts,
+                          pickups_in_view, pickups_within, sample_positions, time_view, top_flows, trip_extremes,
+                          uber_derived, uber_derived_in_view)
+from uber_geo import METRES_PER_DEGREE, viewport_bounds, zoom_for_radius
+from uber_store import load_uber_version, uber_date_range_input, uber_parquet_files, uber_time_filter_input, uber_version
+from uber_stream import load_uber_aggregates
 
 # Title and introduction
 st.title("Uberdata Visualization")
@@ -31,328 +37,572 @@ st.sidebar.write(
 )
 page = st.sidebar.radio("Select a page:", ["Introduction", "Pickups and Dropoffs", "Time", "Zones"])
 
+# Streaming mode: the trip files are too large for memory, so they are read in
+# chunks once and only the aggregates behind the charts are kept
+if st.sidebar.toggle("Streaming mode for oversized trip files"):
+    aggregates = load_uber_aggregates()
+    view_state = pdk.ViewState(
+        latitude=aggregates['lat_mean'],
+        longitude=aggregates['lon_mean'],
+        zoom=12,
+        pitch=0,
+    )
+
+    if page == "Introduction":
+        st.write("Let's get started.")
+
+    elif page == "Pickups and Dropoffs":
+        trips = pd.DataFrame([
+            dict(aggregates['longest'], label='Longest Trip', line_width=7, color=[255, 0, 0]),
+            dict(aggregates['shortest'], label='Shortest Trip', line_width=5, color=[0, 255, 0]),
+        ])
+
+        st.subheader("Longest and Shortest Trips")
+        st.write("This visualization displays the longest trip in red and the shortest trip in green.")
+        st.pydeck_chart(CompactDeck(
+            initial_view_state=view_state,
+            layers=[
+                map_layer(
+                    'LineLayer',
+                    trips,
+                    get_source_position='[start_lon, start_lat]',
+                    get_target_position='[end_lon, end_lat]',
+                    get_color='color',
+                    get_width='line_width',
+                    pickable=True,
+                    tooltip={
+                        "html": "<b>{label}</b>",
+                        "style": {"color": "black"},
+                    },
+                ),
+            ],
+        ))
+        st.info("Point samples and trip lines need the full data in memory and are not shown in streaming mode.")
+
+    elif page == "Time":
+        st.subheader("Histogram of Trips by Hour")
+        st.write("This histogram shows the number of trips taken during each hour of the day, revealing peak activity times.")
+        st.bar_chart(aggregates['hourly'])
+        st.info("Trip durations need the full data in memory and are not shown in streaming mode.")
+
+    elif page == "Zones":
+        cells = aggregates['cells']
+
+        st.subheader("Density Heatmap of Trips")
+        st.write("This heatmap shows the density of trips, highlighting the busiest areas in New York City.")
+        st.pydeck_chart(CompactDeck(
+            initial_view_state=view_state,
+            layers=[
+                map_layer(
+                    'HeatmapLayer',
+                    cells,
+                    get_position='[Lon, Lat]',
+                    auto_highlight=True,
+                    get_weight='count',
+                    radius_pixels=50,
+                ),
+            ],
+        ))
+
+        st.subheader("Clusters of Most Popular Pickup and Dropoff Areas")
+        st.write("This visualization clusters the most popular pickup and dropoff areas, allowing users to explore the frequency of trips in different zones.")
+        st.pydeck_chart(CompactDeck(
+            initial_view_state=view_state,
+            layers=[
+                map_layer(
+                    'HexagonLayer',
+                    cells,
+                    get_position='[Lon, Lat]',
+                    get_elevation_weight='count',
+                    get_color_weight='count',
+                    elevation_aggregation='SUM',
+                    color_aggregation='SUM',
+                    radius=100,
+                    opacity=0.6,
+                    elevation_range=[0, 1000],
+                    elevation_scale=4,
+                    pickable=True,
+                    extruded=True,
+                    tooltip=True,
+                ),
+            ],
+        ))
+
+        st.subheader("Popular Pickup and Dropoff Areas")
+        st.write("This map displays clusters of the most popular pickup and dropoff areas in NYC.")
+        st.pydeck_chart(CompactDeck(
+            initial_view_state=view_state,
+            layers=[
+                map_layer(
+                    "ScatterplotLayer",
+                    cells.nlargest(40, 'count').rename(columns={'count': 'Frequency'}),
+                    get_position='[Lon, Lat]',
+                    get_fill_color='[255, 255, 255, 25]',
+                    get_radius=600,
+                    pickable=True,
+                    tooltip={
+                        "html": "<b>Pickup Area</b><br/>Frequency: {Frequency}",
+                        "style": {"color": "black"},
+                    },
+                ),
+            ],
+        ))
+
+    st.stop()
+
+# Load only the days overlapping the selected range (cached, read-only and shared across sessions;
+# derived columns come from the uber_derived registry)
+start_date, end_date = uber_date_range_input()
+version = uber_version(start_date, end_date)
+data = load_uber_version(version)
+if data.empty:
+    st.warning("No trips were recorded in the selected date range.")
+    st.stop()
+
+# Narrow the loaded range to some days and hours of the day; the charts read
+# the rows in view by binary search over the time-sorted data
+days_shown, hours_shown = uber_time_filter_input(start_date, end_date)
+view = time_view(version, days_shown, hours_shown)
+
+# Optional SQL engine for the hourly and location counts, scanning the Parquet caches
+use_sql = sql_backend_toggle()
+
 if page == "Introduction":
     st.write("Let's get started.")
     
 elif page == "Pickups and Dropoffs":
-    # Calculate the distance for each trip
-    data['next_lat'] = data['Lat'].shift(-1)
-    data['next_lon'] = data['Lon'].shift(-1)
-
-    # Remove rows with null next_lat or next_lon
-    data.dropna(subset=['next_lat', 'next_lon'], inplace=True)
-
-    # Calculate the distance (this can be adapted for real distance calculations)
-    data['distance'] = ((data['next_lat'] - data['Lat']) ** 2 + (data['next_lon'] - data['Lon']) ** 2) ** 0.5
-
-    # Find the longest and shortest trips
-    longest_trip_index = data['distance'].idxmax()
-    shortest_trip_index = data['distance'].idxmin()
-
-    # Ensure the shortest trip is not zero
-    if data['distance'].min() == 0:
-        shortest_trip_index = data[data['distance'] > 0]['distance'].idxmin()
-
-    longest_trip = data.loc[longest_trip_index]
-    shortest_trip = data.loc[shortest_trip_index]
-
-    # Create a DataFrame for the trips
-    trips = pd.DataFrame({
-        'start_lat': [longest_trip['Lat'], shortest_trip['Lat']],
-        'start_lon': [longest_trip['Lon'], shortest_trip['Lon']],
-        'end_lat': [longest_trip['next_lat'], shortest_trip['next_lat']],
-        'end_lon': [longest_trip['next_lon'], shortest_trip['next_lon']],
-        'label': ['Longest Trip', 'Shortest Trip'],
-        'line_width': [7, 5],  # Adjusted width
-        'color': [[255, 0, 0], [0, 255, 0]]  # Red for longest, green for shortest
-    })
+    # Pickups paired with the next pickup as dropoff (a shared, read-only view)
+    data = uber_derived(version, 'trips')
+
+    # Find the longest and shortest non-zero trips (haversine distance, cached per dataset version)
+    trip_count = st.slider("Number of longest and shortest trips:", 1, 10, 1)
 
     # Visualization 1: Trips
     st.subheader("Longest and Shortest Trips")
-    st.write("This visualization displays the longest trip in red and the shortest trip in green.")
-    deck1 = pdk.Deck(
-        initial_view_state=pdk.ViewState(
-            latitude=data['Lat'].mean(),
-            longitude=data['Lon'].mean(),
-            zoom=12,
-            pitch=0,
-        ),
-        layers=[
-            pdk.Layer(
-                'LineLayer',
-                data=trips,
-                get_source_position='[start_lon, start_lat]',
-                get_target_position='[end_lon, end_lat]',
-                get_color='color',
-                get_width='line_width',
-                pickable=True,
-                tooltip={
-                    "html": "<b>{label}</b>",
-                    "style": {"color": "black"},
-                },
+    st.write("This visualization displays the longest trips in red and the shortest trips in green.")
+    chart = ChartArtifact('trip_extremes', version, trips=trip_count, view=view)
+    if chart.missing:
+        longest_trips, shortest_trips = trip_extremes(version, trip_count, view)
+
+        # Create a DataFrame for the trips
+        trips = pd.concat([
+            longest_trips.assign(label='Longest Trip', line_width=7, color=[[255, 0, 0]] * len(longest_trips)),  # Red for longest
+            shortest_trips.assign(label='Shortest Trip', line_width=5, color=[[0, 255, 0]] * len(shortest_trips)),  # Green for shortest
+        ], ignore_index=True)
+
+        deck1 = CompactDeck(
+            initial_view_state=pdk.ViewState(
+                latitude=uber_derived(version, 'lat_mean'),
+                longitude=uber_derived(version, 'lon_mean'),
+                zoom=12,
+                pitch=0,
             ),
-        ],
-    )
+            layers=[
+                map_layer(
+                    'LineLayer',
+                    trips,
+                    get_source_position='[start_lon, start_lat]',
+                    get_target_position='[end_lon, end_lat]',
+                    get_color='color',
+                    get_width='line_width',
+                    pickable=True,
+                    tooltip={
+                        "html": "<b>{label}</b>",
+                        "style": {"color": "black"},
+                    },
+                ),
+            ],
+        )
+        chart.save(deck1)
 
     # Display the first visualization
-    st.pydeck_chart(deck1)
+    chart.show()
 
     # Visualization 3: Pickup and Dropoff Points
     st.subheader("Pickup and Dropoff Points")
     st.write("This map displays pickup points in blue and dropoff points in red randomly selected from the dataset.")
 
-    # Sample 150 random pickups and dropoffs
-    pickup_data = data[['Lat', 'Lon']].sample(150, random_state=42).copy()  # Randomly sample pickups
-    pickup_data['color'] = 'blue'  # Assign color for pickups
-    dropoff_data = data[['next_lat', 'next_lon']].sample(150, random_state=42).copy()  # Randomly sample dropoffs
-    dropoff_data.columns = ['Lat', 'Lon']
-    dropoff_data['color'] = 'red'  # Assign color for dropoffs
-
-    # Create a combined DataFrame for the points
-    pickup_data['type'] = 'Pickup'
-    dropoff_data['type'] = 'Dropoff'
-    points = pd.concat([pickup_data, dropoff_data], ignore_index=True)
-
-    # Create the map with pickup and dropoff points
-    deck2 = pdk.Deck(
-        initial_view_state=pdk.ViewState(
-            latitude=data['Lat'].mean(),
-            longitude=data['Lon'].mean(),
-            zoom=12,
-            pitch=0,
-        ),
-        layers=[
-            pdk.Layer(
-                "ScatterplotLayer",
-                data=pickup_data,
-                get_position='[Lon, Lat]',
-                get_fill_color='[0, 0, 255]',  # Blue for pickups
-                get_radius=100,
-                pickable=True,
-                tooltip={
-                    "html": "Pickup Point",
-                    "style": {"color": "black"},
-                },
-            ),
-            pdk.Layer(
-                "ScatterplotLayer",
-                data=dropoff_data,
-                get_position='[Lon, Lat]',
-                get_fill_color='[255, 0, 0]',  # Red for dropoffs
-                get_radius=100,
-                pickable=True,
-                tooltip={
-                    "html": "Dropoff Point",
-                    "style": {"color": "black"},
-                },
+    # Samples are prefixes of random orders drawn once per dataset version,
+    # so a sample only gathers its own rows
+    col1, col2 = st.columns(2)
+    sample_size = col1.select_slider("Sample size:", options=SAMPLE_SIZES, value=150)
+    sample_strata = col2.radio("Sample drawn:", list(SAMPLE_STRATA), horizontal=True)
+    sample = sample_positions(version, sample_size, sample_strata, view)
+
+    chart = ChartArtifact('sample_points', version, size=sample_size, strata=sample_strata, view=view)
+    if chart.missing:
+        # Gather the sampled pickups and their dropoffs
+        sample_trips = data.iloc[sample]
+        pickup_data = sample_trips[['Lat', 'Lon']].copy()  # Sampled pickups
+        pickup_data['color'] = 'blue'  # Assign color for pickups
+        dropoff_data = sample_trips[['next_lat', 'next_lon']].copy()  # Dropoffs of the same trips
+        dropoff_data.columns = ['Lat', 'Lon']
+        dropoff_data['color'] = 'red'  # Assign color for dropoffs
+
+        # Create a combined DataFrame for the points
+        pickup_data['type'] = 'Pickup'
+        dropoff_data['type'] = 'Dropoff'
+        points = pd.concat([pickup_data, dropoff_data], ignore_index=True)
+
+        # Create the map with pickup and dropoff points
+        deck2 = CompactDeck(
+            initial_view_state=pdk.ViewState(
+                latitude=uber_derived(version, 'lat_mean'),
+                longitude=uber_derived(version, 'lon_mean'),
+                zoom=12,
+                pitch=0,
             ),
-        ],
-    )
+            layers=[
+                map_layer(
+                    "ScatterplotLayer",
+                    pickup_data,
+                    get_position='[Lon, Lat]',
+                    get_fill_color='[0, 0, 255]',  # Blue for pickups
+                    get_radius=100,
+                    pickable=True,
+                    tooltip={
+                        "html": "Pickup Point",
+                        "style": {"color": "black"},
+                    },
+                ),
+                map_layer(
+                    "ScatterplotLayer",
+                    dropoff_data,
+                    get_position='[Lon, Lat]',
+                    get_fill_color='[255, 0, 0]',  # Red for dropoffs
+                    get_radius=100,
+                    pickable=True,
+                    tooltip={
+                        "html": "Dropoff Point",
+                        "style": {"color": "black"},
+                    },
+                ),
+            ],
+        )
+
+        chart.save(deck2)
 
     # Display the second visualization
-    st.pydeck_chart(deck2)
+    chart.show()
 
     # Visualization: Trip Lines from Pickup to Dropoff
     st.subheader("Trip Lines from Pickup to Dropoff")
-    st.write("This map shows fine lines indicating the trips from pickup to dropoff for 100 random samples.")
-
-    # Sample 100 random rows for trip lines
-    sample_trips = data.sample(100, random_state=42)
-
-    # Create a DataFrame for the lines, including next_lat and next_lon
-    trip_lines = pd.DataFrame({
-        'start_lat': sample_trips['Lat'],
-        'start_lon': sample_trips['Lon'],
-        'end_lat': sample_trips['next_lat'],
-        'end_lon': sample_trips['next_lon'],
-    })
-
-    # Create the map with lines for the trips
-    deck3 = pdk.Deck(
-        initial_view_state=pdk.ViewState(
-            latitude=data['Lat'].mean(),
-            longitude=data['Lon'].mean(),
-            zoom=12,
-            pitch=0,
-        ),
-        layers=[
-            pdk.Layer(
-                'LineLayer',
-                data=trip_lines,
-                get_source_position='[start_lon, start_lat]',
-                get_target_position='[end_lon, end_lat]',
-                get_color='[0, 0, 255]',  # Blue color for all lines
-                get_width=2,
-                pickable=True,
-                tooltip={
-                    "html": "Trip from Pickup to Dropoff",
-                    "style": {"color": "black"},
-                },
+    st.write(f"This map shows fine lines indicating the trips from pickup to dropoff for {sample_size} random samples.")
+
+    chart = ChartArtifact('sample_lines', version, size=sample_size, strata=sample_strata, view=view)
+    if chart.missing:
+        # The same sampled trips as the points above
+        sample_trips = data.iloc[sample]
+
+        # Create a DataFrame for the lines, including next_lat and next_lon
+        trip_lines = pd.DataFrame({
+            'start_lat': sample_trips['Lat'],
+            'start_lon': sample_trips['Lon'],
+            'end_lat': sample_trips['next_lat'],
+            'end_lon': sample_trips['next_lon'],
+        })
+
+        # Create the map with lines for the trips
+        deck3 = CompactDeck(
+            initial_view_state=pdk.ViewState(
+                latitude=uber_derived(version, 'lat_mean'),
+                longitude=uber_derived(version, 'lon_mean'),
+                zoom=12,
+                pitch=0,
             ),
-        ],
-    )
+            layers=[
+                map_layer(
+                    'LineLayer',
+                    trip_lines,
+                    get_source_position='[start_lon, start_lat]',
+                    get_target_position='[end_lon, end_lat]',
+                    get_color='[0, 0, 255]',  # Blue color for all lines
+                    get_width=2,
+                    pickable=True,
+                    tooltip={
+                        "html": "Trip from Pickup to Dropoff",
+                        "style": {"color": "black"},
+                    },
+                ),
+            ],
+        )
+
+        chart.save(deck3)
 
     # Display the third visualization
-    st.pydeck_chart(deck3)
+    chart.show()
+
+    # Visualization: Trip Flows Between Areas (every trip counted by origin and destination cell)
+    st.subheader("Trip Flows Between Areas")
+    st.write("This map shows the busiest flows between areas, counted over every trip; wider arcs carry more trips.")
+    col1, col2 = st.columns(2)
+    flow_size = col1.select_slider("Flow cell size (metres):", options=[250, 500, 1000, 2000], value=500)
+    flow_count = col2.slider("Number of flows:", 50, 500, 200, step=50)
+
+    chart = ChartArtifact('flows', version, cell_size=flow_size, flows=flow_count, view=view)
+    if chart.missing:
+        # The largest origin-destination flows, from the sparse OD counts of all trips
+        flows = top_flows(version, flow_size / METRES_PER_DEGREE, flow_count, view)
+        peak = int(flows['count'].max()) if len(flows) else 1
+
+        # Create the map with one arc per flow, blue at the origin and red at the destination
+        deck_flows = CompactDeck(
+            initial_view_state=pdk.ViewState(
+                latitude=uber_derived(version, 'lat_mean'),
+                longitude=uber_derived(version, 'lon_mean'),
+                zoom=11,
+                pitch=40,
+            ),
+            layers=[
+                map_layer(
+                    'ArcLayer',
+                    flows,
+                    get_source_position='[start_lon, start_lat]',
+                    get_target_position='[end_lon, end_lat]',
+                    get_source_color='[0, 0, 255, 160]',
+                    get_target_color='[255, 0, 0, 160]',
+                    get_width=f'1 + count * {9 / peak}',
+                    pickable=True,
+                ),
+            ],
+            tooltip={"text": "{count} trips"},
+        )
+
+        chart.save(deck_flows)
+
+    # Display the flows
+    chart.show()
 
 elif page == "Time":
     # Visualization 2: Histogram of Trips by Hour
     st.subheader("Histogram of Trips by Hour")
     st.write("This histogram shows the number of trips taken during each hour of the day, revealing peak activity times.")
-    data['hour'] = data['Date/Time'].dt.hour
-    hourly_trips = data['hour'].value_counts().sort_index()
+    # Slice the hourly counts by weekday, day of the month and Base
+    col1, col2 = st.columns(2)
+    selected_weekdays = col1.multiselect("Weekdays:", WEEKDAYS, default=WEEKDAYS)
+    base_names = list(data['Base'].cat.categories)
+    selected_bases = col2.multiselect("Bases:", base_names, default=base_names)
+    selected_days = st.slider("Days of the month:", 1, 31, (1, 31))
+    weekday_numbers = [WEEKDAYS.index(weekday) for weekday in selected_weekdays]
+
+    if use_sql:
+        hourly_trips = uber_hourly_counts(uber_parquet_files(), *days_shown,
+                                          weekday_numbers, selected_days, selected_bases, hours_shown)
+    else:
+        hourly_trips = hourly_counts(version, weekday_numbers, selected_days, selected_bases, view)
 
     # Create the histogram
     st.bar_chart(hourly_trips)
 
-    # Ensure correct datetime format
-    data['Dropoff Time'] = data['Date/Time'] + pd.to_timedelta(np.random.randint(5, 60, data.shape[0]), unit='m')
-
-    # Calculate Trip Duration
-    data['Trip Duration'] = (data['Dropoff Time'] - data['Date/Time']).dt.total_seconds() / 60  
+    # Histogram and density of the seeded synthetic trip durations, built once per dataset version and time view
+    duration_histogram = uber_derived_in_view(version, view, 'duration_histogram')
 
     # Calculate the average trip duration
-    average_trip_duration = data['Trip Duration'].mean()
+    average_trip_duration = duration_histogram['mean']
 
     # Visualization: Trip Duration Histogram
     st.subheader("Trip Duration Histogram")
     st.write("This histogram shows the distribution of trip durations in minutes.")
-    st.write(f"The average trip duration is {average_trip_duration:.2f} minutes.")
 
-    plt.figure(figsize=(10, 6))
-    sns.histplot(data['Trip Duration'], bins=30, kde=True)
-    plt.title("Distribution of Trip Durations")
-    plt.xlabel("Duration (minutes)")
-    plt.ylabel("Frequency")
-    st.pyplot(plt)
+    # A time view can select days or hours without any pickup
+    if duration_histogram['total'] == 0:
+        st.info("No trips in this window.")
+    else:
+        st.write(f"The average trip duration is {average_trip_duration:.2f} minutes.")
+
+        chart = ChartArtifact('duration_histogram', version, view=view)
+        if chart.missing:
+            plt.figure(figsize=(10, 6))
+            edges = duration_histogram['edges']
+            sns.histplot(x=edges[:-1], weights=duration_histogram['counts'], bins=edges.tolist(), alpha=0.5)
+            # Density scaled to trips per bin, as seaborn draws it
+            plt.plot(duration_histogram['grid'], duration_histogram['density'] * duration_histogram['total'] * (edges[1] - edges[0]))
+            plt.title("Distribution of Trip Durations")
+            plt.xlabel("Duration (minutes)")
+            plt.ylabel("Frequency")
+            chart.save(plt)
+        chart.show()
 
 elif page == "Zones":
-    # Ensure to include next_lat and next_lon in the sample
-    data['next_lat'] = data['Lat'].shift(-1)
-    data['next_lon'] = data['Lon'].shift(-1)
-
-    # Remove rows with null next_lat or next_lon
-    data.dropna(subset=['next_lat', 'next_lon'], inplace=True)
-
-    # Visualization 5: Density Heatmap of Trips (using half the dataset)
+    # Visualization 5: Density Heatmap of Trips (all trips, binned into grid cells)
     st.subheader("Density Heatmap of Trips")
     st.write("This heatmap shows the density of trips, highlighting the busiest areas in New York City.")
-    half_data = data.sample(frac=0.4, random_state=42)  # Use 40% of the dataset
-
-    deck4 = pdk.Deck(
-        initial_view_state=pdk.ViewState(
-            latitude=half_data['Lat'].mean(),
-            longitude=half_data['Lon'].mean(),
-            zoom=12,
-            pitch=0,
-        ),
-        layers=[
-            pdk.Layer(
-                'HeatmapLayer',
-                data=half_data,
-                get_position='[Lon, Lat]',
-                auto_highlight=True,
-                get_weight='1',
-                radius_pixels=50,
+    cell_size = st.select_slider("Heatmap cell size (metres):", options=[50, 100, 250, 500, 1000], value=100)
+    chart = ChartArtifact('heatmap', version, cell_size=cell_size, view=view)
+    if chart.missing:
+        heatmap_cells = grid_cells(version, cell_size / METRES_PER_DEGREE, view)
+
+        deck4 = CompactDeck(
+            initial_view_state=pdk.ViewState(
+                latitude=uber_derived(version, 'lat_mean'),
+                longitude=uber_derived(version, 'lon_mean'),
+                zoom=12,
+                pitch=0,
             ),
-        ],
-    )
+            layers=[
+                map_layer(
+                    'HeatmapLayer',
+                    heatmap_cells,
+                    get_position='[Lon, Lat]',
+                    auto_highlight=True,
+                    get_weight='count',
+                    radius_pixels=50,
+                ),
+            ],
+        )
+
+        chart.save(deck4)
 
     # Display the heatmap visualization
-    st.pydeck_chart(deck4)
+    chart.show()
 
     # Visualization 6: Clusters of Most Popular Pickup and Dropoff Areas
     st.subheader("Clusters of Most Popular Pickup and Dropoff Areas")
     st.write("This visualization clusters the most popular pickup and dropoff areas, allowing users to explore the frequency of trips in different zones.")
 
-    # Sample 1000 points for clustering
-    cluster_data = data[['Lat', 'Lon']].sample(1000, random_state=42)
-
-    deck5 = pdk.Deck(
-        initial_view_state=pdk.ViewState(
-            latitude=cluster_data['Lat'].mean(),
-            longitude=cluster_data['Lon'].mean(),
-            zoom=12,
-            pitch=0,
-        ),
-        layers=[
-            pdk.Layer(
-                'HexagonLayer',
-                data=cluster_data,
-                get_position='[Lon, Lat]',
-                radius=100,
-                opacity=0.6,
-                elevation_range=[0, 1000],
-                elevation_scale=4,
-                pickable=True,
-                extruded=True,
-                tooltip=True,
+    # Hexagonal bins of all pickups and dropoffs, precomputed at every radius
+    hex_radius = st.select_slider("Hexagon radius (metres):", options=HEX_RADII, value=100)
+    chart = ChartArtifact('hexagons', version, radius=hex_radius, view=view)
+    if chart.missing:
+        hexagons = uber_derived_in_view(version, view, 'hexagons')[hex_radius]
+        peak = int(hexagons['count'].max()) if len(hexagons) else 1
+
+        deck5 = CompactDeck(
+            initial_view_state=pdk.ViewState(
+                latitude=uber_derived(version, 'lat_mean'),
+                longitude=uber_derived(version, 'lon_mean'),
+                zoom=12,
+                pitch=0,
             ),
-        ],
-    )
+            layers=[
+                map_layer(
+                    'ColumnLayer',
+                    hexagons,
+                    get_position='[Lon, Lat]',
+                    get_elevation=f'count * {4000 / peak}',
+                    get_fill_color=f'[255, 255 - count * {255 / peak}, 0]',
+                    radius=hex_radius,
+                    disk_resolution=6,
+                    coverage=0.95,
+                    opacity=0.6,
+                    pickable=True,
+                    extruded=True,
+                ),
+            ],
+            tooltip={"text": "{count} pickups and dropoffs"},
+        )
+
+        chart.save(deck5)
 
     # Display the clusters visualization
-    st.pydeck_chart(deck5)
+    chart.show()
 
 
     # Visualization 7: Popular Pickup and Dropoff Areas with Hover Information
     st.subheader("Popular Pickup and Dropoff Areas")
     st.write("This map displays clusters of the most popular pickup and dropoff areas in NYC.")
 
-    # Count pickup and dropoff frequencies
-    pickup_counts = data.groupby(['Lat', 'Lon']).size().reset_index(name='Frequency')
-    dropoff_counts = data.groupby(['next_lat', 'next_lon']).size().reset_index(name='Frequency')
-
-    # Combine pickup and dropoff counts
-    pickup_counts['Type'] = 'Pickup'
-    dropoff_counts['Type'] = 'Dropoff'
-    combined_counts = pd.concat([pickup_counts, dropoff_counts], ignore_index=True)
-
-    # Identify top 5 pickup and dropoff areas
-    top_pickups = pickup_counts.nlargest(40, 'Frequency')
-    top_dropoffs = dropoff_counts.nlargest(40, 'Frequency')
-
-    # Create a DataFrame for clusters
-    cluster_data = pd.concat([top_pickups, top_dropoffs], ignore_index=True)
-
-    # Create clusters on the map
-    deck5 = pdk.Deck(
-        initial_view_state=pdk.ViewState(
-            latitude=data['Lat'].mean(),
-            longitude=data['Lon'].mean(),
-            zoom=12,
-            pitch=0,
-        ),
-        layers=[
-            pdk.Layer(
-                "ScatterplotLayer",
-                data=top_pickups,
-                get_position='[Lon, Lat]',
-                get_fill_color='[255, 255, 255, 25]',  # White color with 90% opacity
-                get_radius=600,  # Radius of 600
-                pickable=True,
-                tooltip={
-                    "html": "<b>Pickup Area</b><br/>Frequency: {Frequency}",
-                    "style": {"color": "black"},
-                },
-            ),
-            pdk.Layer(
-                "ScatterplotLayer",
-                data=top_dropoffs,
-                get_position='[next_lon, next_lat]',
-                get_fill_color='[255, 255, 255, 25]',  # White color with 90% opacity
-                get_radius=600,  # Radius of 600
-                pickable=True,
-                tooltip={
-                    "html": "<b>Dropoff Area</b><br/>Frequency: {Frequency}",
-                    "style": {"color": "black"},
-                },
+    hotspot_size = st.select_slider("Hotspot cell size (metres):", options=[50, 100, 250, 500, 1000], value=100)
+    hotspot_resolution = hotspot_size / METRES_PER_DEGREE
+
+    chart = ChartArtifact('hotspots', version, cell_size=hotspot_size, sql=use_sql, view=view)
+    if chart.missing:
+        if use_sql:
+            # Count and rank pickup and dropoff cells in DuckDB
+            top_pickups, top_dropoffs = uber_location_counts(uber_parquet_files(), start_date, end_date, hotspot_resolution,
+                                                             days=days_shown, hours=hours_shown)
+        else:
+            # Count pickups and dropoffs per grid cell and keep the 40 busiest of each
+            top_pickups, top_dropoffs = hotspots(version, hotspot_resolution, view=view)
+
+        # Create clusters on the map
+        deck5 = CompactDeck(
+            initial_view_state=pdk.ViewState(
+                latitude=uber_derived(version, 'lat_mean'),
+                longitude=uber_derived(version, 'lon_mean'),
+                zoom=12,
+                pitch=0,
             ),
-        ],
-    )
+            layers=[
+                map_layer(
+                    "ScatterplotLayer",
+                    top_pickups,
+                    get_position='[Lon, Lat]',
+                    get_fill_color='[255, 255, 255, 25]',  # White color with 90% opacity
+                    get_radius=600,  # Radius of 600
+                    pickable=True,
+                    tooltip={
+                        "html": "<b>Pickup Area</b><br/>Frequency: {Frequency}",
+                        "style": {"color": "black"},
+                    },
+                ),
+                map_layer(
+                    "ScatterplotLayer",
+                    top_dropoffs,
+                    get_position='[next_lon, next_lat]',
+                    get_fill_color='[255, 255, 255, 25]',  # White color with 90% opacity
+                    get_radius=600,  # Radius of 600
+                    pickable=True,
+                    tooltip={
+                        "html": "<b>Dropoff Area</b><br/>Frequency: {Frequency}",
+                        "style": {"color": "black"},
+                    },
+                ),
+            ],
+        )
+
+        chart.save(deck5)
 
     # Display the clusters visualization
-    st.pydeck_chart(deck5)
+    chart.show()
+
+
+    # Visualization 8: Pickups Around a Point, answered from the grid index
+    st.subheader("Pickups Around a Point")
+    st.write("Enter a point and a radius to count the pickups around it and see at which hours they happen.")
+    col1, col2, col3 = st.columns(3)
+    query_lat = col1.number_input("Latitude:", value=round(uber_derived(version, 'lat_mean'), 4), format="%.4f")
+    query_lon = col2.number_input("Longitude:", value=round(uber_derived(version, 'lon_mean'), 4), format="%.4f")
+    query_radius = col3.number_input("Radius (metres):", min_value=50, max_value=5000, value=500, step=50)
+    nearby = pickups_within(version, query_lat, query_lon, query_radius, view)
+    st.write(f"{len(nearby):,} pickups within {query_radius} m of this point.")
+
+    hourly_nearby = pd.Series(np.bincount(uber_derived(version, 'hour')[nearby], minlength=24),
+                              index=pd.RangeIndex(24, name='hour'), name='count')
+    st.bar_chart(hourly_nearby)
+
+    chart = ChartArtifact('pickups_around', version, lat=query_lat, lon=query_lon, radius=query_radius, view=view)
+    if chart.missing:
+        # Only the pickups inside the map viewport are sent, matches drawn in red
+        query_zoom = zoom_for_radius(query_lat, query_radius)
+        in_view = pickups_in_view(version, *viewport_bounds(query_lat, query_lon, query_zoom), view)
+        pickups = load_uber_version(version)
+        deck6 = CompactDeck(
+            initial_view_state=pdk.ViewState(
+                latitude=query_lat,
+                longitude=query_lon,
+                zoom=query_zoom,
+                pitch=0,
+            ),
+            layers=[
+                map_layer(
+                    "ScatterplotLayer",
+                    pickups.iloc[np.setdiff1d(in_view, nearby, assume_unique=True)],
+                    get_position='[Lon, Lat]',
+                    get_fill_color='[160, 160, 160, 120]',
+                    get_radius=10,
+                ),
+                map_layer(
+                    "ScatterplotLayer",
+                    pickups.iloc[nearby],
+                    get_position='[Lon, Lat]',
+                    get_fill_color='[255, 0, 0, 160]',
+                    get_radius=10,
+                ),
+            ],
+        )
+        chart.save(deck6)
+    chart.show()
 
      
 